@@ -0,0 +1,218 @@
+import argparse
+import glob
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+from detection_saver import DetectionWriter
+from gps_track import GpsTrack
+from model_registry import load_yolo, reset_trackers
+from roi_preprocess import RoiPreprocessor, parse_mask, parse_roi
+from spatial_dedup import SpatialDedup
+
+VIDEO_EXTENSIONS = (".avi", ".mp4", ".mkv", ".mov")
+# Имя файла записи из webcam_viewer*.py: result/video_20240101_120000.avi
+VIDEO_TIME_PATTERN = re.compile(r"(\d{8}_\d{6})")
+
+# Модель процесса пула, загружается один раз в init_worker
+worker_model = None
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for ext in VIDEO_EXTENSIONS:
+                videos += glob.glob(os.path.join(path, f"*{ext}"))
+        else:
+            videos += glob.glob(path) or [path]
+    return sorted(set(videos))
+
+
+def video_start_time(path):
+    # Время начала записи из имени файла, иначе время изменения файла
+    match = VIDEO_TIME_PATTERN.search(os.path.basename(path))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+    return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 20.0
+    cap.release()
+    return frame_count, fps
+
+
+def make_tasks(videos, chunk_frames):
+    # Задание - файл целиком или диапазон кадров [start, end)
+    tasks = []
+    for path in videos:
+        frame_count, fps = video_info(path)
+        if chunk_frames and frame_count > chunk_frames:
+            for start in range(0, frame_count, chunk_frames):
+                tasks.append((path, start, min(start + chunk_frames, frame_count), fps))
+        else:
+            tasks.append((path, 0, None, fps))
+    return tasks
+
+
+def frame_positions(gps_path, gps_offset, start_time, start_frame, end_frame, fps):
+    # Координаты для каждого кадра задания одним векторным запросом к треку
+    track = GpsTrack.from_file(gps_path, offset=gps_offset)
+    frame_times = start_time.timestamp() + np.arange(start_frame, end_frame) / fps
+    return track.positions(frame_times)
+
+
+def init_worker(model_path):
+    # Выполняется один раз при запуске процесса пула
+    global worker_model
+    worker_model = load_yolo(model_path)
+
+
+def seek_frame(cap, start_frame):
+    # CAP_PROP_POS_FRAMES неточен для AVI/MJPEG и файлов с переменной частотой
+    # кадров: переход может встать рядом с нужным кадром, а не на него. Для
+    # частей записи это дает сдвиг на несколько кадров на границе частей
+    # (во времени кадра и координатах); номер кадра берется из того, что
+    # сообщил декодер после перехода.
+    if not start_frame:
+        return 0
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    return int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+
+def process_task(path, start_frame, end_frame, fps, output_dir, sink, gps_path=None, gps_offset=0.0,
+                 dedup_radius=0.0, roi=None, max_side=None, mask=None):
+    # Выполняется в процессе пула: модель процесса, трекер заново для каждого задания
+    model = worker_model
+    reset_trackers(model)
+    # Индекс повторов общий для всех процессов и прошлых запусков
+    dedup = None
+    if gps_path and dedup_radius:
+        dedup = SpatialDedup(os.path.join(output_dir, "spatial_index.sqlite"), dedup_radius)
+    writer = DetectionWriter(output_dir, sink=sink, dedup=dedup)
+    preprocess = RoiPreprocessor(roi, max_side, mask)
+    saved_track_ids = set()
+    source = os.path.splitext(os.path.basename(path))[0]
+    start_time = video_start_time(path)
+
+    cap = cv2.VideoCapture(path)
+    start_frame = seek_frame(cap, start_frame)
+    lats = lons = None
+    if gps_path:
+        last_frame = end_frame if end_frame is not None else int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        lats, lons = frame_positions(gps_path, gps_offset, start_time, start_frame, max(last_frame, start_frame), fps)
+    frame_index = start_frame
+    frames = 0
+    detections = 0
+    started = time.perf_counter()
+    while cap.isOpened() and (end_frame is None or frame_index < end_frame):
+        success, frame = cap.read()
+        if not success:
+            break
+
+        results = preprocess.track(model, frame, persist=True, verbose=False)
+        if results[0].boxes is not None and results[0].boxes.id is not None:
+            boxes = results[0].boxes.xywh.cpu()
+            track_ids = results[0].boxes.id.int().cpu().tolist()
+            class_ids = results[0].boxes.cls.int().cpu().tolist()
+            for box, track_id, cls in zip(boxes, track_ids, class_ids):
+                if track_id in saved_track_ids:
+                    continue
+                x, y, w, h = box
+                label = model.names[cls]
+                detected_at = start_time + timedelta(seconds=frame_index / fps)
+                extra = {"Source": source, "FrameIndex": frame_index}
+                offset = frame_index - start_frame
+                if lats is not None and offset < len(lats) and not np.isnan(lats[offset]):
+                    extra["Latitude"] = round(float(lats[offset]), 7)
+                    extra["Longitude"] = round(float(lons[offset]), 7)
+                writer.submit(frame, (float(x), float(y), float(w), float(h)), label, track_id,
+                              extra=extra, detected_at=detected_at)
+                saved_track_ids.add(track_id)
+                detections += 1
+        frame_index += 1
+        frames += 1
+
+    cap.release()
+    writer.close()
+    if dedup:
+        dedup.close()
+    return {
+        "path": path,
+        "start_frame": start_frame,
+        "frames": frames,
+        "detections": detections,
+        "duplicates": writer.deduplicated,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная обработка записанных видео без отображения")
+    parser.add_argument("paths", nargs="+", help="видеофайлы, маски или папки (например, result)")
+    parser.add_argument("--model", default="neural_network_models/yolov8n.pt")
+    parser.add_argument("--output-dir", default="result_images")
+    parser.add_argument("--sink", choices=["json", "jsonl", "sqlite"], default="json",
+                        help="формат журнала обнаружений")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="число процессов")
+    parser.add_argument("--chunk-frames", type=int, default=0,
+                        help="делить файлы на части по столько кадров (0 - по файлам)")
+    parser.add_argument("--gps", help="трек GPS (.gpx или журнал NMEA) для координат обнаружений")
+    parser.add_argument("--gps-offset", type=float, default=0.0,
+                        help="поправка времени видео относительно GPS, с")
+    parser.add_argument("--dedup-radius", type=float, default=15.0,
+                        help="радиус повторов одного дефекта, м (0 - отключено; нужен --gps)")
+    parser.add_argument("--roi", help='область кадра для нейросети "x1,y1,x2,y2" в долях, например "0,0.4,1,1"')
+    parser.add_argument("--max-side", type=int, help="уменьшать изображение для нейросети до этой стороны, пикс.")
+    parser.add_argument("--roi-mask",
+                        help='маска дороги "x,y;x,y;..." в долях кадра, например "0,1;0.4,0.4;0.6,0.4;1,1"')
+    args = parser.parse_args()
+
+    videos = find_videos(args.paths)
+    if not videos:
+        print("Видеофайлы не найдены.")
+        return
+    os.makedirs(args.output_dir, exist_ok=True)
+    tasks = make_tasks(videos, args.chunk_frames)
+    if args.gps:
+        # Трек разбирается один раз; процессы загружают готовый индекс (.npz)
+        track = GpsTrack.from_file(args.gps)
+        print(f"Трек GPS: {len(track)} точек")
+    print(f"Файлов: {len(videos)}, заданий: {len(tasks)}, процессов: {args.workers}")
+
+    started = time.perf_counter()
+    total_frames = 0
+    total_detections = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.model,)) as executor:
+        futures = [executor.submit(process_task, path, start, end, fps, args.output_dir, args.sink,
+                                   args.gps, args.gps_offset, args.dedup_radius, parse_roi(args.roi), args.max_side,
+                                   parse_mask(args.roi_mask))
+                   for path, start, end, fps in tasks]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Ошибка обработки: {e}")
+                continue
+            total_frames += result["frames"]
+            total_detections += result["detections"]
+            fps = result["frames"] / result["seconds"] if result["seconds"] > 0 else 0.0
+            print(f"{result['path']} [с кадра {result['start_frame']}]: {result['frames']} кадров, "
+                  f"{result['detections']} объектов (повторов {result['duplicates']}), {fps:.1f} кадров/с")
+
+    elapsed = time.perf_counter() - started
+    print(f"Итого: {total_frames} кадров, {total_detections} объектов за {elapsed:.1f} с, "
+          f"{total_frames / elapsed if elapsed > 0 else 0.0:.1f} кадров/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from detection_saver import DetectionWriter, annotate_detection, build_metadata, new_detection_name
+from detection_sink import create_sink
+from overlay_renderer import OverlayRenderer
+from track_store import TrackStore
+
+# Этапы без нейросети замеряются один раз на видео, остальные - на каждую модель и размер входа
+FRAME_STAGES = ["decode", "encode", "json"]
+MODEL_STAGES = ["track", "overlay", "e2e"]
+ALL_STAGES = FRAME_STAGES + MODEL_STAGES
+
+
+def peak_rss_mb():
+    # Пиковый объем памяти процесса; каждая конфигурация выполняется в своем процессе
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux сообщает в КБ, macOS - в байтах
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies, elapsed=None):
+    # Частота кадров и перцентили задержки, мс
+    if not latencies:
+        return {"frames": 0}
+    values = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    elapsed = elapsed if elapsed is not None else float(np.sum(values)) / 1000
+    return {
+        "frames": len(latencies),
+        "fps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+    }
+
+
+def read_frames(video, frames):
+    # Кадры видео по одному (не в памяти целиком), не больше frames
+    cap = cv2.VideoCapture(video)
+    try:
+        for _ in range(frames):
+            success, frame = cap.read()
+            if not success:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def center_box(frame):
+    # Условная рамка для замера кодирования снимка без нейросети
+    height, width = frame.shape[:2]
+    return width / 2, height / 2, width / 3, height / 3
+
+
+def bench_decode(video, frames):
+    latencies = []
+    cap = cv2.VideoCapture(video)
+    start = time.perf_counter()
+    for _ in range(frames):
+        t0 = time.perf_counter()
+        success, _ = cap.read()
+        if not success:
+            break
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return summarize(latencies, elapsed)
+
+
+def bench_encode(video, frames):
+    # Рамка, подпись и JPEG снимка, как в write_detection
+    latencies = []
+    for frame in read_frames(video, frames):
+        t0 = time.perf_counter()
+        annotated = annotate_detection(frame, *center_box(frame), "pothole", 1)
+        cv2.imencode(".jpg", annotated)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies)
+
+
+def bench_json(frames, sink_kind, work_dir):
+    latencies = []
+    sink = create_sink(sink_kind, os.path.join(work_dir, "json"))
+    for i in range(frames):
+        t0 = time.perf_counter()
+        timestamp, base_filename = new_detection_name("pothole", i)
+        sink.write(build_metadata(timestamp, "pothole", f"{base_filename}.jpg", track_id=i), base_filename)
+        latencies.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    sink.close()
+    # Отложенная запись журналов JSONL и SQLite учитывается в последнем замере
+    if latencies:
+        latencies[-1] += time.perf_counter() - t0
+    return summarize(latencies)
+
+
+def bench_track(model, video, frames, imgsz):
+    # model.track и отрисовка результата на одном проходе по видео
+    track_latencies = []
+    overlay_latencies = []
+    renderer = OverlayRenderer(model.names)
+    track_history = TrackStore()
+    for frame in read_frames(video, frames):
+        t0 = time.perf_counter()
+        results = model.track(frame, persist=True, verbose=False, imgsz=imgsz)
+        track_latencies.append(time.perf_counter() - t0)
+        result = results[0]
+        if result.boxes is not None and result.boxes.id is not None:
+            track_ids = result.boxes.id.int().cpu().tolist()
+            for (x, y, _, _), track_id in zip(result.boxes.xywh.cpu().tolist(), track_ids):
+                track_history.add(track_id, x, y)
+        t0 = time.perf_counter()
+        renderer.render(frame, result, track_history)
+        overlay_latencies.append(time.perf_counter() - t0)
+    return summarize(track_latencies), summarize(overlay_latencies)
+
+
+def bench_e2e(model, video, frames, imgsz, sink_kind, work_dir):
+    # Цикл приложения без окна: чтение, трекинг, история треков,
+    # сохранение новых объектов в фоне и отрисовка
+    writer = DetectionWriter(os.path.join(work_dir, "e2e"), sink=sink_kind)
+    renderer = OverlayRenderer(model.names)
+    track_history = TrackStore()
+    saved_track_ids = set()
+    latencies = []
+    cap = cv2.VideoCapture(video)
+    start = time.perf_counter()
+    for _ in range(frames):
+        t0 = time.perf_counter()
+        success, frame = cap.read()
+        if not success:
+            break
+        results = model.track(frame, persist=True, verbose=False, imgsz=imgsz)
+        result = results[0]
+        saved_track_ids.difference_update(track_history.evict())
+        if result.boxes is not None and result.boxes.id is not None:
+            boxes = result.boxes.xywh.cpu().tolist()
+            track_ids = result.boxes.id.int().cpu().tolist()
+            class_ids = result.boxes.cls.int().cpu().tolist()
+            for (x, y, w, h), track_id, cls in zip(boxes, track_ids, class_ids):
+                track_history.add(track_id, x, y)
+                if track_id not in saved_track_ids:
+                    writer.submit(frame, (x, y, w, h), model.names[cls], track_id)
+                    saved_track_ids.add(track_id)
+        renderer.render(frame, result, track_history)
+        latencies.append(time.perf_counter() - t0)
+    cap.release()
+    # Время дописывания очереди снимков входит в общее время
+    writer.close()
+    elapsed = time.perf_counter() - start
+    report = summarize(latencies, elapsed)
+    report["writer"] = writer.stats()
+    return report
+
+
+def run_config(config):
+    # Выполняется в отдельном процессе, чтобы пиковая память относилась
+    # только к этой конфигурации
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    video, frames, stages = config["video"], config["frames"], config["stages"]
+    results = {}
+    try:
+        if config["model"] is None:
+            if "decode" in stages:
+                results["decode"] = bench_decode(video, frames)
+            if "encode" in stages:
+                results["encode"] = bench_encode(video, frames)
+            if "json" in stages:
+                results["json"] = bench_json(frames, config["sink"], work_dir)
+        else:
+            from model_registry import load_yolo, warm_up
+            load_start = time.perf_counter()
+            model = load_yolo(config["model"])
+            warm_up(model, config["imgsz"])
+            results["load_s"] = round(time.perf_counter() - load_start, 2)
+            if "track" in stages or "overlay" in stages:
+                track, overlay = bench_track(model, video, frames, config["imgsz"])
+                if "track" in stages:
+                    results["track"] = track
+                if "overlay" in stages:
+                    results["overlay"] = overlay
+            if "e2e" in stages:
+                # Новый трекер для независимого прохода
+                model = load_yolo(config["model"])
+                warm_up(model, config["imgsz"])
+                results["e2e"] = bench_e2e(model, video, frames, config["imgsz"], config["sink"], work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    results["peak_rss_mb"] = peak_rss_mb()
+    return dict(config, results=results)
+
+
+def environment():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+    try:
+        import ultralytics
+        info["ultralytics"] = ultralytics.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def make_configs(args):
+    configs = []
+    frame_stages = [stage for stage in args.stages if stage in FRAME_STAGES]
+    model_stages = [stage for stage in args.stages if stage in MODEL_STAGES]
+    for video in args.videos:
+        base = {"video": video, "frames": args.frames, "sink": args.sink}
+        if frame_stages:
+            configs.append(dict(base, model=None, imgsz=None, stages=frame_stages))
+        if model_stages:
+            for model in args.models:
+                for imgsz in args.imgsz:
+                    configs.append(dict(base, model=model, imgsz=imgsz, stages=model_stages))
+    return configs
+
+
+def config_name(config):
+    name = os.path.basename(config["video"])
+    if config["model"]:
+        name += f" {os.path.basename(config['model'])} imgsz={config['imgsz']}"
+    return name
+
+
+def print_report(report, baseline=None):
+    # Таблица FPS и p95 по этапам; с baseline - изменение FPS в процентах
+    previous = {}
+    for run in (baseline or {}).get("runs", []):
+        previous[config_name(run)] = run["results"]
+    for run in report["runs"]:
+        name = config_name(run)
+        results = run["results"]
+        print(f"{name} (пиковая память {results.get('peak_rss_mb')} МБ)")
+        for stage in ALL_STAGES:
+            if stage not in results or not results[stage].get("frames"):
+                continue
+            stage_result = results[stage]
+            line = (f"  {stage:8s} {stage_result['fps']:8.1f} кадров/с  p50 {stage_result['p50_ms']:7.2f}  "
+                    f"p95 {stage_result['p95_ms']:7.2f}  p99 {stage_result['p99_ms']:7.2f} мс")
+            old = previous.get(name, {}).get(stage)
+            if old and old.get("fps"):
+                line += f"  ({(stage_result['fps'] / old['fps'] - 1) * 100:+.1f}% FPS)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер производительности этапов захват -> трекинг -> сохранение")
+    parser.add_argument("videos", nargs="+", help="записанные видео, заменяющие камеры")
+    parser.add_argument("--models", nargs="+", default=["neural_network_models/yolov8n.pt"])
+    parser.add_argument("--imgsz", nargs="+", type=int, default=[640], help="размеры входа модели")
+    parser.add_argument("--frames", type=int, default=300, help="кадров на этап")
+    parser.add_argument("--stages", nargs="+", choices=ALL_STAGES, default=ALL_STAGES)
+    parser.add_argument("--sink", choices=["json", "jsonl", "sqlite"], default="json",
+                        help="формат журнала для этапов json и e2e")
+    parser.add_argument("--output", help="файл результатов (по умолчанию result/bench_<время>.json)")
+    parser.add_argument("--compare", help="файл прошлого запуска для сравнения")
+    args = parser.parse_args()
+
+    configs = make_configs(args)
+    runs = []
+    # Конфигурации выполняются по одной в новом процессе: замеры не мешают
+    # друг другу, а пиковая память считается отдельно
+    context = multiprocessing.get_context("spawn")
+    for config in configs:
+        print(f"Замер: {config_name(config)}")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                runs.append(executor.submit(run_config, config).result())
+            except Exception as e:
+                print(f"Ошибка замера {config_name(config)}: {e}")
+
+    report = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "args": vars(args),
+        "runs": runs,
+    }
+    output = args.output or os.path.join("result", f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"Результаты сохранены: {output}")
+
+
+if __name__ == "__main__":
+    main()
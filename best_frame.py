@@ -0,0 +1,99 @@
+import time
+
+import cv2
+
+
+class Candidate:
+    """Лучший на данный момент кадр трека."""
+
+    __slots__ = ("track_id", "label", "frame", "box", "confidence", "score", "timestamp", "first_seen", "last_seen")
+
+    def __init__(self, track_id, label, frame, box, confidence, score, timestamp):
+        self.track_id = track_id
+        self.label = label
+        self.frame = frame
+        self.box = box
+        self.confidence = confidence
+        self.score = score
+        self.timestamp = timestamp  # время лучшего кадра (time.time())
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+
+
+class BestFrameSelector:
+    """Выбор лучшего кадра для каждого трека вместо первого появления.
+
+    Оценка кадра - произведение уверенности, относительной площади рамки,
+    резкости (дисперсия Лапласиана) и удаленности от края кадра. Для трека
+    хранится только ссылка на лучший кадр (кадры не копируются и не
+    изменяются). Кандидат отдается на сохранение, когда трек не появлялся
+    end_after секунд или прошло commit_timeout секунд с первого появления.
+    """
+
+    def __init__(self, end_after=1.0, commit_timeout=10.0, sharpness_ref=300.0, edge_margin=0.05):
+        self.end_after = end_after
+        self.commit_timeout = commit_timeout
+        self.sharpness_ref = sharpness_ref  # дисперсия Лапласиана, считающаяся полностью резкой
+        self.edge_margin = edge_margin  # доля размера кадра, ближе которой к краю оценка снижается
+        self.candidates = {}
+        self.sharpness_checks = 0
+
+    def _geometry_score(self, frame, box, confidence):
+        frame_h, frame_w = frame.shape[:2]
+        x, y, w, h = box
+        area = (w * h) / float(frame_w * frame_h)
+        edge_distance = min(x - w / 2, y - h / 2, frame_w - (x + w / 2), frame_h - (y + h / 2))
+        margin = self.edge_margin * min(frame_w, frame_h)
+        edge = min(max(edge_distance / margin, 0.0), 1.0) if margin > 0 else 1.0
+        return confidence * area * (0.1 + 0.9 * edge)
+
+    def _sharpness(self, frame, box):
+        frame_h, frame_w = frame.shape[:2]
+        x, y, w, h = box
+        x1, y1 = max(int(x - w / 2), 0), max(int(y - h / 2), 0)
+        x2, y2 = min(int(x + w / 2), frame_w), min(int(y + h / 2), frame_h)
+        if x2 - x1 < 3 or y2 - y1 < 3:
+            return 0.0
+        gray = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        self.sharpness_checks += 1
+        variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+        return min(variance / self.sharpness_ref, 1.0)
+
+    def observe(self, track_id, label, frame, box, confidence, now=None):
+        now = time.time() if now is None else now
+        candidate = self.candidates.get(track_id)
+        if candidate is not None:
+            candidate.last_seen = now
+        geometry = self._geometry_score(frame, box, confidence)
+        # Резкость не больше 1, поэтому лапласиан считается, только если
+        # кадр вообще может оказаться лучше текущего
+        if candidate is not None and geometry <= candidate.score:
+            return
+        score = geometry * (0.2 + 0.8 * self._sharpness(frame, box))
+        if candidate is None:
+            self.candidates[track_id] = Candidate(track_id, label, frame, box, confidence, score, now)
+        elif score > candidate.score:
+            candidate.label = label
+            candidate.frame = frame
+            candidate.box = box
+            candidate.confidence = confidence
+            candidate.score = score
+            candidate.timestamp = now
+
+    def poll(self, now=None):
+        # Кандидаты, готовые к сохранению: трек закончился или истек таймаут
+        now = time.time() if now is None else now
+        ready = [c for c in self.candidates.values()
+                 if now - c.last_seen >= self.end_after or now - c.first_seen >= self.commit_timeout]
+        for candidate in ready:
+            del self.candidates[candidate.track_id]
+        return ready
+
+    def flush(self):
+        # Все оставшиеся кандидаты (при завершении работы)
+        ready = list(self.candidates.values())
+        self.candidates.clear()
+        return ready
+
+    def stats(self):
+        return {"pending": len(self.candidates), "sharpness_checks": self.sharpness_checks}
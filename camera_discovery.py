@@ -0,0 +1,263 @@
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import cv2
+
+# Разрешения, поддержка которых проверяется при опросе камеры
+PROBE_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+class CameraInfo:
+    """Сведения о камере: индекс, устройство и возможности."""
+
+    def __init__(self, index, path=None, name=None, available=False, width=0, height=0, fps=0.0,
+                 resolutions=None, probe_seconds=0.0):
+        self.index = index
+        self.path = path  # /dev/videoN (только Linux)
+        self.name = name  # имя устройства из /sys/class/video4linux
+        self.available = available
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.resolutions = resolutions or []
+        self.probe_seconds = probe_seconds
+
+    def to_dict(self):
+        return dict(self.__dict__, resolutions=[list(r) for r in self.resolutions])
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data, resolutions=[tuple(r) for r in data.get("resolutions", [])])
+        return cls(**data)
+
+    def describe(self):
+        text = f"{self.index}: {self.name or 'камера'}"
+        if self.width:
+            text += f", {self.width}x{self.height}"
+        if self.fps:
+            text += f" @ {self.fps:.0f} fps"
+        return text
+
+
+def video_devices():
+    # Устройства захвата Linux без их открытия: {индекс: (путь, имя)}.
+    # Служебные узлы метаданных UVC (index != 0 в sysfs) пропускаются.
+    devices = {}
+    for path in glob.glob("/dev/video*"):
+        match = re.fullmatch(r"/dev/video(\d+)", path)
+        if not match:
+            continue
+        index = int(match.group(1))
+        sys_dir = f"/sys/class/video4linux/video{index}"
+        try:
+            with open(os.path.join(sys_dir, "index")) as f:
+                if f.read().strip() not in ("", "0"):
+                    continue
+        except OSError:
+            pass
+        try:
+            with open(os.path.join(sys_dir, "name")) as f:
+                name = f.read().strip()
+        except OSError:
+            name = None
+        devices[index] = (path, name)
+    return devices
+
+
+def probe_camera(index, path=None, name=None, resolutions=PROBE_RESOLUTIONS):
+    # Открывает камеру и определяет разрешение по умолчанию, частоту и
+    # поддерживаемые разрешения из PROBE_RESOLUTIONS
+    start = time.perf_counter()
+    info = CameraInfo(index, path, name)
+    cap = cv2.VideoCapture(index, cv2.CAP_V4L2) if path else cv2.VideoCapture(index)
+    try:
+        if not cap.isOpened():
+            return info
+        info.available = True
+        info.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        info.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        info.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        for width, height in resolutions:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            actual = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            if actual == (width, height):
+                info.resolutions.append(actual)
+        return info
+    finally:
+        cap.release()
+        info.probe_seconds = round(time.perf_counter() - start, 3)
+
+
+class CameraDiscovery:
+    """Поиск камер без блокировки интерфейса.
+
+    На Linux список устройств берется из /dev/video* и sysfs без открытия
+    камер, на других системах проверяются индексы 0..max_index-1. Камеры
+    опрашиваются параллельно, каждая в своем потоке с ограничением по
+    времени probe_timeout: зависшее устройство считается недоступным и не
+    задерживает остальные. Результаты (с разрешениями и частотой)
+    кэшируются в памяти и в файле cache_path, поэтому при следующем
+    запуске список доступен сразу. Фоновый поток раз в watch_interval
+    секунд сравнивает список /dev/video* и опрашивает только новые
+    устройства; при изменениях увеличивается version.
+    """
+
+    def __init__(self, max_index=10, probe_timeout=3.0, watch_interval=2.0, cache_path=None):
+        self.max_index = max_index
+        self.probe_timeout = probe_timeout
+        self.watch_interval = watch_interval
+        self.cache_path = cache_path
+        self.linux = sys.platform.startswith("linux") and os.path.isdir("/dev")
+        self.lock = threading.Lock()
+        self.infos = {}  # индекс -> CameraInfo
+        self.busy = set()  # индексы, открытые приложением: их не опрашиваем повторно
+        self.version = 0
+        self.scanning = False
+        self.timeouts = 0
+        self.running = False
+        self.thread = None
+        self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = [CameraInfo.from_dict(item) for item in json.load(f)]
+        except (OSError, ValueError, TypeError):
+            return
+        present = video_devices() if self.linux else None
+        for info in cached:
+            # На Linux из кэша берутся только подключенные сейчас устройства с тем же именем
+            if present is not None and present.get(info.index) != (info.path, info.name):
+                continue
+            self.infos[info.index] = info
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        with self.lock:
+            data = [info.to_dict() for info in self.infos.values() if info.available]
+        try:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except OSError:
+            pass
+
+    def set_busy(self, index, busy=True):
+        # Открытую приложением камеру нельзя открыть второй раз для опроса
+        with self.lock:
+            if busy:
+                self.busy.add(index)
+            else:
+                self.busy.discard(index)
+
+    def cameras(self):
+        # Доступные камеры по индексу; не блокирует
+        with self.lock:
+            return [self.infos[i] for i in sorted(self.infos) if self.infos[i].available]
+
+    def indices(self):
+        return [info.index for info in self.cameras()]
+
+    def info(self, index):
+        with self.lock:
+            return self.infos.get(index)
+
+    def _candidates(self):
+        if self.linux:
+            return video_devices()
+        return {index: (None, None) for index in range(self.max_index)}
+
+    def _probe_all(self, candidates):
+        # Параллельный опрос с общим ограничением по времени
+        results = {}
+
+        def run(index, path, name):
+            results[index] = probe_camera(index, path, name)
+
+        threads = []
+        for index, (path, name) in candidates.items():
+            thread = threading.Thread(target=run, args=(index, path, name), name=f"CameraProbe-{index}", daemon=True)
+            thread.start()
+            threads.append((index, path, name, thread))
+        deadline = time.perf_counter() + self.probe_timeout
+        for index, path, name, thread in threads:
+            thread.join(max(deadline - time.perf_counter(), 0))
+            if thread.is_alive():
+                # Поток остается жить до возврата из драйвера, результат не ждем
+                self.timeouts += 1
+                results[index] = CameraInfo(index, path, name, probe_seconds=self.probe_timeout)
+        return {index: results[index] for index, _, _, _ in threads}
+
+    def _update(self, candidates, rescan):
+        with self.lock:
+            skip = set(self.busy) if rescan else set(self.busy) | set(self.infos)
+            removed = [i for i in self.infos if i not in candidates and i not in self.busy]
+        probed = self._probe_all({i: c for i, c in candidates.items() if i not in skip})
+        with self.lock:
+            before = [info.index for info in self.infos.values() if info.available]
+            for index in removed:
+                del self.infos[index]
+            for index in candidates:
+                if index in self.busy and index not in self.infos:
+                    # Занятая приложением камера заведомо доступна
+                    path, name = candidates[index]
+                    self.infos[index] = CameraInfo(index, path, name, available=True)
+            self.infos.update(probed)
+            after = [info.index for info in self.infos.values() if info.available]
+            if sorted(before) != sorted(after):
+                self.version += 1
+        self._save_cache()
+
+    def scan(self, rescan=False):
+        # Синхронный опрос (для скриптов); rescan - опросить и закэшированные камеры
+        self.scanning = True
+        try:
+            self._update(self._candidates(), rescan)
+        finally:
+            self.scanning = False
+        return self.cameras()
+
+    def start(self):
+        # Первый опрос и слежение за подключением камер в фоне
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="CameraDiscovery", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        # На системах без /dev/video* камеры опрашиваются только при запуске
+        self.scan(rescan=not self.linux)
+        known = set(self._candidates()) if self.linux else None
+        while self.running and self.linux:
+            time.sleep(self.watch_interval)
+            candidates = self._candidates()
+            if set(candidates) != known:
+                known = set(candidates)
+                self.scanning = True
+                try:
+                    self._update(candidates, rescan=False)
+                finally:
+                    self.scanning = False
+
+    def stats(self):
+        with self.lock:
+            return {
+                "cameras": sum(1 for info in self.infos.values() if info.available),
+                "devices": len(self.infos),
+                "busy": len(self.busy),
+                "scanning": self.scanning,
+                "timeouts": self.timeouts,
+                "version": self.version,
+            }
+
+    def stop(self):
+        self.running = False
@@ -24,7 +24,7 @@ while True:
         for box in boxes:
             cls = int(box.cls[0])
             track_id = int(box.id[0]) if box.id is not None else 'N/A'
-            label = model.model.names[cls]  # Имя класса
+            label = model.names[cls]  # Имя класса
             confidence = box.conf[0]
             x1, y1, x2, y2 = map(int, box.xyxy[0])
 
@@ -0,0 +1,304 @@
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S_%f"
+TRACK_ID_PATTERN = re.compile(r"_ID_(\d+)_")
+# Журнал SQLite (detection_sink.SqliteSink)
+SQLITE_SINK_NAME = "detections.sqlite"
+EARTH_RADIUS_M = 6371000.0
+
+
+class DetectionIndex:
+    """Индекс метаданных обнаружений из result_images.
+
+    Хранится в SQLite рядом с данными и обновляется инкрементально:
+    JSON-файлы, уже попавшие в индекс, повторно не читаются, журналы
+    JSONL дочитываются с сохраненного смещения, а из журнала
+    detections.sqlite берутся строки с id больше последнего прочитанного.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sources (
+            path TEXT PRIMARY KEY,
+            mtime REAL,
+            offset INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS detections (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            detected_at REAL NOT NULL,
+            day_seconds REAL NOT NULL,
+            class_name TEXT,
+            track_id INTEGER,
+            latitude REAL,
+            longitude REAL,
+            critical_level INTEGER,
+            image_name TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_time ON detections (detected_at);
+        CREATE INDEX IF NOT EXISTS idx_class_time ON detections (class_name, detected_at);
+        CREATE INDEX IF NOT EXISTS idx_track ON detections (track_id);
+        CREATE INDEX IF NOT EXISTS idx_lat_lon ON detections (latitude, longitude);
+        CREATE INDEX IF NOT EXISTS idx_source ON detections (source);
+    """
+
+    def __init__(self, data_dir="result_images", index_path=None):
+        self.data_dir = data_dir
+        self.index_path = index_path or os.path.join(data_dir, "detection_index.sqlite")
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.executescript(self.SCHEMA)
+        self.conn.create_function("distance_m", 4, distance_m, deterministic=True)
+
+    def update(self):
+        # Инкрементальное обновление индекса. Возвращает (новых записей, секунд)
+        start = time.perf_counter()
+        added = 0
+        with self.conn:
+            if os.path.isdir(self.data_dir):
+                for entry in os.scandir(self.data_dir):
+                    if entry.name.endswith(".json"):
+                        if self._source(entry.name) is None:
+                            added += self._index_json(entry)
+                    elif entry.name.endswith(".jsonl"):
+                        mtime, offset = self._source(entry.name) or (None, 0)
+                        if mtime != entry.stat().st_mtime:
+                            added += self._index_jsonl(entry, offset)
+                    elif entry.name == SQLITE_SINK_NAME:
+                        # Время изменения основного файла в режиме WAL ненадежно,
+                        # поэтому новые строки ищутся всегда (по первичному ключу)
+                        _, last_id = self._source(entry.name) or (None, 0)
+                        added += self._index_sqlite(entry, last_id)
+        return added, time.perf_counter() - start
+
+    def _source(self, name):
+        # (mtime, offset) уже проиндексированного файла или None
+        return self.conn.execute("SELECT mtime, offset FROM sources WHERE path = ?", (name,)).fetchone()
+
+    def rebuild(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM detections")
+            self.conn.execute("DELETE FROM sources")
+        return self.update()
+
+    def _index_json(self, entry):
+        try:
+            with open(entry.path, encoding='utf-8') as json_file:
+                data = json.load(json_file)
+        except (OSError, ValueError):
+            return 0
+        row = make_row(entry.name, data)
+        if row:
+            self.conn.execute("INSERT INTO detections (source, detected_at, day_seconds, class_name, track_id, "
+                              "latitude, longitude, critical_level, image_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              row)
+        self.conn.execute("INSERT OR REPLACE INTO sources (path, mtime, offset) VALUES (?, ?, 0)",
+                          (entry.name, entry.stat().st_mtime))
+        return 1 if row else 0
+
+    def _index_jsonl(self, entry, offset):
+        rows = []
+        with open(entry.path, 'rb') as jsonl_file:
+            jsonl_file.seek(offset)
+            for line in jsonl_file:
+                if not line.endswith(b"\n"):
+                    # Незаконченная строка будет дочитана при следующем обновлении
+                    break
+                offset += len(line)
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+                if "Road" in data:
+                    continue
+                row = make_row(entry.name, data)
+                if row:
+                    rows.append(row)
+        self.conn.executemany("INSERT INTO detections (source, detected_at, day_seconds, class_name, track_id, "
+                              "latitude, longitude, critical_level, image_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              rows)
+        self.conn.execute("INSERT OR REPLACE INTO sources (path, mtime, offset) VALUES (?, ?, ?)",
+                          (entry.name, entry.stat().st_mtime, offset))
+        return len(rows)
+
+    def _index_sqlite(self, entry, last_id):
+        sink = sqlite3.connect(f"file:{entry.path}?mode=ro", uri=True, timeout=30)
+        try:
+            records = sink.execute(
+                "SELECT id, detected_at, class_name, track_id, latitude, longitude, critical_level, image_name "
+                "FROM detections WHERE id > ? ORDER BY id", (last_id,)).fetchall()
+        except sqlite3.OperationalError:
+            return 0
+        finally:
+            sink.close()
+        rows = []
+        for record_id, detected_at, class_name, track_id, lat, lon, critical, image_name in records:
+            last_id = record_id
+            row = make_row(entry.name, {"DateTimeDetection": detected_at, "ClassName": class_name,
+                                        "TrackId": track_id, "Latitude": lat, "Longitude": lon,
+                                        "CriticalLevel": critical, "ImageName": image_name})
+            if row:
+                rows.append(row)
+        self.conn.executemany("INSERT INTO detections (source, detected_at, day_seconds, class_name, track_id, "
+                              "latitude, longitude, critical_level, image_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              rows)
+        self.conn.execute("INSERT OR REPLACE INTO sources (path, mtime, offset) VALUES (?, ?, ?)",
+                          (entry.name, entry.stat().st_mtime, last_id))
+        return len(rows)
+
+    def query(self, class_name=None, since=None, until=None, time_from=None, time_to=None,
+              track_id=None, near=None, radius_m=None, min_critical=None, limit=None):
+        # since/until - datetime, time_from/time_to - секунды от начала суток,
+        # near - (широта, долгота), radius_m - радиус поиска в метрах
+        conditions = []
+        params = []
+        if class_name:
+            conditions.append("class_name = ?")
+            params.append(class_name)
+        if since:
+            conditions.append("detected_at >= ?")
+            params.append(since.timestamp())
+        if until:
+            conditions.append("detected_at < ?")
+            params.append(until.timestamp())
+        if time_from is not None and time_to is not None and time_from > time_to:
+            # Интервал через полночь
+            conditions.append("(day_seconds >= ? OR day_seconds < ?)")
+            params += [time_from, time_to]
+        else:
+            if time_from is not None:
+                conditions.append("day_seconds >= ?")
+                params.append(time_from)
+            if time_to is not None:
+                conditions.append("day_seconds < ?")
+                params.append(time_to)
+        if track_id is not None:
+            conditions.append("track_id = ?")
+            params.append(track_id)
+        if min_critical is not None:
+            conditions.append("critical_level >= ?")
+            params.append(min_critical)
+        if near and radius_m:
+            # Грубый отбор по прямоугольнику через индекс, затем точное расстояние
+            lat, lon = near
+            dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+            dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+            conditions.append("latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?")
+            params += [lat - dlat, lat + dlat, lon - dlon, lon + dlon]
+            conditions.append("distance_m(latitude, longitude, ?, ?) <= ?")
+            params += [lat, lon, radius_m]
+
+        sql = ("SELECT detected_at, class_name, track_id, latitude, longitude, critical_level, image_name, source "
+               "FROM detections")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY detected_at"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self.conn.execute(sql, params).fetchall()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+def make_row(source, data):
+    timestamp = data.get("DateTimeDetection")
+    try:
+        detected = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return None
+    track_id = data.get("TrackId")
+    if track_id is None:
+        # Старые файлы без поля TrackId: идентификатор есть в имени
+        match = TRACK_ID_PATTERN.search(data.get("ImageName") or source)
+        track_id = int(match.group(1)) if match else None
+    day_seconds = detected.hour * 3600 + detected.minute * 60 + detected.second + detected.microsecond / 1e6
+    return (source, detected.timestamp(), day_seconds, data.get("ClassName"), track_id,
+            to_float(data.get("Latitude")), to_float(data.get("Longitude")),
+            data.get("CriticalLevel"), data.get("ImageName"))
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    # Расстояние по формуле гаверсинусов
+    if lat1 is None or lon1 is None:
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def parse_time_of_day(value):
+    parts = [int(p) for p in value.split(":")]
+    while len(parts) < 3:
+        parts.append(0)
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+
+def parse_datetime(value):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Неверная дата: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Индекс и поиск обнаружений в result_images")
+    parser.add_argument("--dir", default="result_images", help="папка с результатами")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="построить или обновить индекс")
+    build_parser.add_argument("--rebuild", action="store_true", help="построить индекс заново")
+
+    query_parser = subparsers.add_parser("query", help="поиск обнаружений")
+    query_parser.add_argument("--class", dest="class_name", help="имя класса, например pothole")
+    query_parser.add_argument("--since", type=parse_datetime, help="не раньше, \"YYYY-MM-DD HH:MM\"")
+    query_parser.add_argument("--until", type=parse_datetime, help="раньше, \"YYYY-MM-DD HH:MM\"")
+    query_parser.add_argument("--time-from", type=parse_time_of_day, help="время суток от, HH:MM")
+    query_parser.add_argument("--time-to", type=parse_time_of_day, help="время суток до, HH:MM")
+    query_parser.add_argument("--track-id", type=int)
+    query_parser.add_argument("--near", help="широта,долгота центра поиска")
+    query_parser.add_argument("--radius", type=float, default=500.0, help="радиус поиска, м")
+    query_parser.add_argument("--min-critical", type=int, help="минимальный CriticalLevel")
+    query_parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    index = DetectionIndex(args.dir)
+    if args.command == "build":
+        added, elapsed = index.rebuild() if args.rebuild else index.update()
+        print(f"Индекс обновлен: добавлено {added}, всего {index.count()}, за {elapsed * 1000:.1f} мс")
+    else:
+        added, elapsed = index.update()
+        near = tuple(float(v) for v in args.near.split(",")) if args.near else None
+        start = time.perf_counter()
+        rows = index.query(args.class_name, args.since, args.until, args.time_from, args.time_to,
+                           args.track_id, near, args.radius if near else None, args.min_critical, args.limit)
+        query_time = time.perf_counter() - start
+        for detected_at, class_name, track_id, lat, lon, critical, image_name, source in rows:
+            when = datetime.fromtimestamp(detected_at).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{when}\t{class_name}\tID:{track_id}\t{lat}\t{lon}\t{critical}\t{image_name or source}")
+        print(f"Найдено {len(rows)} за {query_time * 1000:.1f} мс "
+              f"(обновление индекса: +{added} за {elapsed * 1000:.1f} мс)")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import cv2
+
+from detection_sink import JsonFileSink, create_sink
+
+# Постоянные поля описания участка дороги
+ROAD_FIELDS = {
+    "SectionOfRoad": "Участок дороги",
+    "RoadClass": "Автомагистраль",
+    "RoadCategory": "IВ Общее число полос движения 4 и более",
+    "Contractor": "Подрядная организация",
+}
+
+
+def annotate_detection(frame, x, y, w, h, label, track_id):
+    # Копия кадра с рамкой и подписью найденного объекта
+    annotated_frame = frame.copy()
+    cv2.rectangle(annotated_frame, (int(x - w / 2), int(y - h / 2)), (int(x + w / 2), int(y + h / 2)), (0, 255, 0), 2)
+    cv2.putText(annotated_frame, f'{label} ID:{track_id}', (int(x - w / 2), int(y - h / 2) - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    return annotated_frame
+
+
+def build_metadata(timestamp, label, image_name, extra=None, track_id=None):
+    json_data = {
+        "DateTimeDetection": timestamp,
+        "ClassName": label,
+        "TrackId": track_id,
+        "Latitude": "N/A",
+        "Longitude": "N/A",
+        "SectionOfRoad": ROAD_FIELDS["SectionOfRoad"],
+        "CriticalLevel": 1,
+        "RoadClass": ROAD_FIELDS["RoadClass"],
+        "RoadCategory": ROAD_FIELDS["RoadCategory"],
+        "Contractor": ROAD_FIELDS["Contractor"],
+        "ImageName": image_name,
+    }
+    if extra:
+        json_data.update(extra)
+    return json_data
+
+
+def new_detection_name(label, track_id, detected_at=None):
+    # Время обнаружения и базовое имя файлов фиксируются в момент обнаружения.
+    # Для записанного видео detected_at - время кадра, а не текущее.
+    timestamp = (detected_at or datetime.now()).strftime("%Y-%m-%d_%H-%M-%S_%f")
+    unique_id = uuid.uuid4()
+    return timestamp, f"{timestamp}_{label}_ID_{track_id}_{unique_id}"
+
+
+def write_detection(frame, box, label, track_id, timestamp, base_filename, output_dir="result_images", extra=None,
+                    sink=None, metrics=None):
+    # Снимок всегда сохраняется в output_dir, метаданные - в журнал sink
+    # (по умолчанию отдельный JSON-файл рядом со снимком)
+    start = time.perf_counter()
+    x, y, w, h = box
+    annotated_frame = annotate_detection(frame, x, y, w, h, label, track_id)
+    image_filename = os.path.join(output_dir, f"{base_filename}.jpg")
+    ok, jpeg = cv2.imencode(".jpg", annotated_frame)
+    if not ok:
+        raise RuntimeError(f"Не удалось закодировать {image_filename}")
+    encoded = time.perf_counter()
+    with open(image_filename, "wb") as f:
+        f.write(jpeg.tobytes())
+
+    json_data = build_metadata(timestamp, label, os.path.basename(image_filename), extra, track_id)
+    if sink is None:
+        sink = JsonFileSink(output_dir)
+    sink.write(json_data, base_filename)
+    if metrics:
+        metrics.record("encode", encoded - start)
+        metrics.record("write", time.perf_counter() - encoded)
+
+
+class DetectionWriter:
+    """Фоновое сохранение снимков и JSON.
+
+    Цикл обработки кадров только ставит в очередь ссылку на кадр и
+    метаданные; кодирование JPEG и запись файлов выполняет пул потоков.
+    Если очередь заполнена, submit ждет не дольше block_timeout и
+    учитывает это в счетчиках backpressure; с block=False (вызов из потока
+    окна) запись сразу отбрасывается. Если передан metrics,
+    учитывается время этапов "encode" и "write". Если передан location
+    (LocationService), координаты на момент обнаружения подставляются
+    в Latitude/Longitude уже в потоке записи. Если передан dedup
+    (SpatialDedup), обнаружение с координатами рядом с уже сохраненным
+    дефектом того же класса только учитывается в индексе, без файлов;
+    новый дефект, файлы которого записать не удалось, из индекса удаляется.
+    Поэтому submit возвращает только имя поставленной в очередь записи, а
+    все, что зависит от появления файлов (клип события, уведомление),
+    выполняет on_saved(base_filename) - он вызывается в потоке записи
+    только после того, как снимок и метаданные действительно записаны.
+    """
+
+    def __init__(self, output_dir="result_images", workers=2, queue_size=64, block_timeout=0.5, sink="json",
+                 metrics=None, location=None, dedup=None):
+        self.output_dir = output_dir
+        self.metrics = metrics
+        self.location = location
+        self.dedup = dedup
+        os.makedirs(output_dir, exist_ok=True)
+        # sink - объект журнала или его тип ("json", "jsonl", "sqlite")
+        self.sink = create_sink(sink, output_dir) if isinstance(sink, str) else sink
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+
+        # Счетчики
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.deduplicated = 0  # повторы известных дефектов, не записанные в файлы
+        self.backpressure = 0  # сколько раз очередь оказалась заполнена
+        self.max_depth = 0
+        self.last_error = None
+
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name=f"DetectionWriter-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        self.closed = False
+
+    def submit(self, frame, box, label, track_id, extra=None, detected_at=None, block=True, on_saved=None):
+        # Возвращает базовое имя файлов или None, если запись пришлось отбросить.
+        # Имя возвращается сразу, а повтор известного дефекта определяется
+        # позже, поэтому о записанных файлах сообщает только on_saved
+        detected_at = detected_at or datetime.now()
+        timestamp, base_filename = new_detection_name(label, track_id, detected_at)
+        item = (frame, box, label, track_id, timestamp, base_filename, extra, detected_at.timestamp(), on_saved)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            with self.lock:
+                self.backpressure += 1
+                if not block:
+                    self.dropped += 1
+                    return None
+            try:
+                self.queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                with self.lock:
+                    self.dropped += 1
+                return None
+        with self.lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+        return base_filename
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            frame, box, label, track_id, timestamp, base_filename, extra, detected_ts, on_saved = item
+            try:
+                if self.location is not None:
+                    # Координаты, заданные явно (например, при обработке записи), не заменяются
+                    extra = dict(self.location.fields(detected_ts), **(extra or {}))
+                defect_id = None
+                if self.dedup is not None:
+                    is_new, defect_id = self._register(label, extra, detected_ts, base_filename)
+                    if not is_new:
+                        with self.lock:
+                            self.deduplicated += 1
+                        continue
+                try:
+                    write_detection(frame, box, label, track_id, timestamp, base_filename, self.output_dir, extra,
+                                    self.sink, self.metrics)
+                except Exception:
+                    if defect_id is not None:
+                        self.dedup.forget(defect_id)
+                    raise
+                with self.lock:
+                    self.written += 1
+                if on_saved is not None:
+                    on_saved(base_filename)
+            except Exception as e:
+                with self.lock:
+                    self.failed += 1
+                    self.last_error = e
+            finally:
+                self.queue.task_done()
+
+    def _register(self, label, extra, detected_ts, base_filename):
+        # (новый ли дефект, id в индексе повторов или None).
+        # Без координат повтор определить нельзя, такое обнаружение сохраняется
+        lat, lon = (extra or {}).get("Latitude"), (extra or {}).get("Longitude")
+        if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+            return True, None
+        defect_id = self.dedup.register(label, lat, lon, datetime.fromtimestamp(detected_ts), f"{base_filename}.jpg")
+        return defect_id is not None, defect_id
+
+    def stats(self):
+        with self.lock:
+            return {
+                "submitted": self.submitted,
+                "written": self.written,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "deduplicated": self.deduplicated,
+                "backpressure": self.backpressure,
+                "queue_depth": self.queue.qsize(),
+                "max_depth": self.max_depth,
+            }
+
+    def flush(self):
+        # Дождаться записи всего, что уже поставлено в очередь
+        self.queue.join()
+        self.sink.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.flush()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.sink.close()
@@ -0,0 +1,341 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Поля, одинаковые для всех обнаружений участка дороги. В журналах JSONL
+# и SQLite они хранятся один раз, а не в каждой записи.
+ROAD_KEYS = ("SectionOfRoad", "RoadClass", "RoadCategory", "Contractor")
+# Индекс строк журналов JSONL по времени, классу и треку
+JSONL_INDEX = "jsonl_index.sqlite"
+
+
+def split_record(json_data):
+    # Разделение метаданных на постоянные поля дороги и саму запись
+    road = {key: json_data[key] for key in ROAD_KEYS if key in json_data}
+    record = {key: value for key, value in json_data.items() if key not in ROAD_KEYS}
+    return road, record
+
+
+class PeriodicFlush:
+    """Вызов flush в фоновом потоке каждые interval секунд.
+
+    Накопленные записи попадают на диск, даже если новых обнаружений
+    долго нет.
+    """
+
+    def __init__(self, interval, flush):
+        self.interval = interval
+        self.flush = flush
+        self.last_error = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        if interval:
+            self.thread = threading.Thread(target=self._run, name="PeriodicFlush", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.last_error = e
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+class JsonFileSink:
+    """Один JSON-файл на обнаружение (прежний формат result_images)."""
+
+    def __init__(self, output_dir="result_images"):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, json_data, base_filename):
+        json_filename = os.path.join(self.output_dir, f"{base_filename}.json")
+        with open(json_filename, 'w', encoding='utf-8') as json_file:
+            json.dump(json_data, json_file, indent=4, ensure_ascii=False)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    """Журнал обнаружений в формате JSON Lines, один файл на день.
+
+    Первая строка файла и каждая смена полей дороги записываются как
+    {"Road": {...}}, остальные строки - компактные записи обнаружений.
+    Строки накапливаются и дописываются одним вызовом os.write в файл,
+    открытый с O_APPEND, каждые flush_every записей или flush_interval
+    секунд; каждая такая порция начинается со строки Road, поэтому порции
+    нескольких процессов, пишущих в один файл, не перепутываются.
+    Смещение каждой записи вместе со временем, классом и
+    идентификатором трека сохраняется в индекс jsonl_index.sqlite, по
+    которому find_jsonl читает только нужные строки.
+    """
+
+    INDEX_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS lines (
+            file TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            detected_at TEXT,
+            class_name TEXT,
+            track_id INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_lines_time ON lines (detected_at);
+        CREATE INDEX IF NOT EXISTS idx_lines_class ON lines (class_name, detected_at);
+        CREATE INDEX IF NOT EXISTS idx_lines_track ON lines (track_id);
+    """
+
+    def __init__(self, output_dir="result_images", flush_every=50, flush_interval=2.0):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.fd = None
+        self.file_name = None
+        self.day = None
+        self.road = None
+        self.lines = []  # (строка в байтах, (время, класс, трек) или None для строки Road)
+        self.index = sqlite3.connect(os.path.join(output_dir, JSONL_INDEX), timeout=30, check_same_thread=False)
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.executescript(self.INDEX_SCHEMA)
+        self.flusher = PeriodicFlush(flush_interval, self.flush)
+
+    def _open(self, day):
+        self._write_lines()
+        if self.fd is not None:
+            os.close(self.fd)
+        self.file_name = f"detections_{day}.jsonl"
+        self.fd = os.open(os.path.join(self.output_dir, self.file_name), os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+                          0o644)
+        self.day = day
+        self.road = None
+
+    def _write_lines(self):
+        if self.fd is None or not self.lines:
+            self.lines = []
+            return
+        data = b"".join(line for line, _ in self.lines)
+        written = os.write(self.fd, data)
+        if written != len(data):
+            raise OSError(f"Записано {written} из {len(data)} байт в {self.file_name}")
+        # После записи с O_APPEND позиция указывает на конец только что дописанных строк
+        offset = os.lseek(self.fd, 0, os.SEEK_CUR) - len(data)
+        rows = []
+        for line, key in self.lines:
+            if key:
+                rows.append((self.file_name, offset, len(line)) + key)
+            offset += len(line)
+        self.lines = []
+        # Следующая порция снова начнется со строки Road
+        self.road = None
+        with self.index:
+            self.index.executemany("INSERT INTO lines (file, offset, length, detected_at, class_name, track_id) "
+                                   "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def write(self, json_data, base_filename):
+        road, record = split_record(json_data)
+        record["BaseName"] = base_filename
+        # День берется из времени обнаружения, формат "%Y-%m-%d_%H-%M-%S_%f"
+        timestamp = record.get("DateTimeDetection") or datetime.now().strftime("%Y-%m-%d")
+        day = timestamp[:10]
+        with self.lock:
+            if day != self.day:
+                self._open(day)
+            if road != self.road:
+                self.lines.append(((json.dumps({"Road": road}, ensure_ascii=False) + "\n").encode("utf-8"), None))
+                self.road = road
+            key = (record.get("DateTimeDetection"), record.get("ClassName"), record.get("TrackId"))
+            self.lines.append(((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"), key))
+            if sum(1 for _, key in self.lines if key) >= self.flush_every:
+                self._write_lines()
+
+    def flush(self):
+        with self.lock:
+            self._write_lines()
+
+    def close(self):
+        self.flusher.close()
+        with self.lock:
+            self._write_lines()
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            self.index.close()
+
+
+def find_jsonl(output_dir="result_images", class_name=None, track_id=None, since=None, until=None, limit=None):
+    # Записи журналов JSONL по индексу; since/until - datetime
+    conditions = []
+    params = []
+    if class_name:
+        conditions.append("class_name = ?")
+        params.append(class_name)
+    if track_id is not None:
+        conditions.append("track_id = ?")
+        params.append(track_id)
+    # Время в формате DateTimeDetection сравнивается как строка
+    if since:
+        conditions.append("detected_at >= ?")
+        params.append(since.strftime("%Y-%m-%d_%H-%M-%S_%f"))
+    if until:
+        conditions.append("detected_at < ?")
+        params.append(until.strftime("%Y-%m-%d_%H-%M-%S_%f"))
+    sql = "SELECT file, offset, length FROM lines"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY detected_at"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    conn = sqlite3.connect(os.path.join(output_dir, JSONL_INDEX))
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+    records = []
+    files = {}
+    try:
+        for file_name, offset, length in rows:
+            if file_name not in files:
+                files[file_name] = open(os.path.join(output_dir, file_name), 'rb')
+            jsonl_file = files[file_name]
+            jsonl_file.seek(offset)
+            records.append(json.loads(jsonl_file.read(length)))
+    finally:
+        for jsonl_file in files.values():
+            jsonl_file.close()
+    return records
+
+
+class SqliteSink:
+    """Журнал обнаружений в SQLite с пакетной фиксацией транзакций.
+
+    Записи накапливаются и фиксируются одной транзакцией каждые
+    batch_size записей или batch_interval секунд (по таймеру, даже без
+    новых записей). Есть индексы по времени, классу и идентификатору трека.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS road_sections (
+            id INTEGER PRIMARY KEY,
+            section_of_road TEXT, road_class TEXT, road_category TEXT, contractor TEXT,
+            UNIQUE (section_of_road, road_class, road_category, contractor)
+        );
+        CREATE TABLE IF NOT EXISTS detections (
+            id INTEGER PRIMARY KEY,
+            detected_at TEXT NOT NULL,
+            class_name TEXT NOT NULL,
+            track_id INTEGER,
+            latitude REAL,
+            longitude REAL,
+            critical_level INTEGER,
+            image_name TEXT,
+            base_name TEXT,
+            road_section_id INTEGER REFERENCES road_sections(id),
+            extra TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_detections_time ON detections (detected_at);
+        CREATE INDEX IF NOT EXISTS idx_detections_class ON detections (class_name, detected_at);
+        CREATE INDEX IF NOT EXISTS idx_detections_track ON detections (track_id);
+    """
+    KNOWN_KEYS = ("DateTimeDetection", "ClassName", "TrackId", "Latitude", "Longitude",
+                  "CriticalLevel", "ImageName")
+
+    def __init__(self, path="result_images/detections.sqlite", batch_size=100, batch_interval=2.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.road_ids = {}
+        self.rows = []
+        self.last_commit = time.monotonic()
+        self.flusher = PeriodicFlush(batch_interval, self.flush)
+
+    def _road_id(self, road):
+        key = tuple(road.get(k) for k in ROAD_KEYS)
+        if key not in self.road_ids:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO road_sections (section_of_road, road_class, road_category, contractor) "
+                "VALUES (?, ?, ?, ?)", key)
+            row = self.conn.execute(
+                "SELECT id FROM road_sections WHERE section_of_road IS ? AND road_class IS ? "
+                "AND road_category IS ? AND contractor IS ?", key).fetchone()
+            self.road_ids[key] = row[0]
+        return self.road_ids[key]
+
+    def write(self, json_data, base_filename):
+        road, record = split_record(json_data)
+        extra = {key: value for key, value in record.items() if key not in self.KNOWN_KEYS}
+        with self.lock:
+            self.rows.append((
+                record.get("DateTimeDetection"),
+                record.get("ClassName"),
+                record.get("TrackId"),
+                to_float(record.get("Latitude")),
+                to_float(record.get("Longitude")),
+                record.get("CriticalLevel"),
+                record.get("ImageName"),
+                base_filename,
+                self._road_id(road),
+                json.dumps(extra, ensure_ascii=False) if extra else None,
+            ))
+            if len(self.rows) >= self.batch_size or time.monotonic() - self.last_commit >= self.batch_interval:
+                self._commit()
+
+    def _commit(self):
+        if self.rows:
+            self.conn.executemany(
+                "INSERT INTO detections (detected_at, class_name, track_id, latitude, longitude, "
+                "critical_level, image_name, base_name, road_section_id, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self.rows)
+            self.rows = []
+        self.conn.commit()
+        self.last_commit = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            if self.rows:
+                self._commit()
+
+    def close(self):
+        self.flusher.close()
+        with self.lock:
+            self._commit()
+            self.conn.close()
+
+
+def to_float(value):
+    # "N/A" и пустые значения координат хранятся как NULL
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def create_sink(kind="json", output_dir="result_images"):
+    # kind: "json" (файл на обнаружение), "jsonl" или "sqlite"
+    if kind == "json":
+        return JsonFileSink(output_dir)
+    if kind == "jsonl":
+        return JsonlSink(output_dir)
+    if kind == "sqlite":
+        return SqliteSink(os.path.join(output_dir, "detections.sqlite"))
+    raise ValueError(f"Неизвестный тип журнала обнаружений: {kind}")
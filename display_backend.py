@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class TkDisplay:
+    """Вывод кадров на tk.Canvas без создания новых объектов на каждый кадр.
+
+    Один элемент изображения на холсте и один PhotoImage создаются при
+    первом кадре (и заново только при смене размера холста). Кадр
+    масштабируется с сохранением пропорций и переводится в RGBA в заранее
+    выделенные буферы, после чего PhotoImage обновляется на месте.
+    Буфер RGBA выбран потому, что PIL может разделять с ним память
+    (для RGB Image.frombuffer делает копию).
+    """
+
+    def __init__(self, canvas, interpolation=cv2.INTER_LINEAR):
+        self.canvas = canvas
+        self.interpolation = interpolation
+        self.item = None
+        self.photo = None
+        self.size = None  # (ширина, высота) выводимого изображения
+        self.resized = None  # буфер BGR нужного размера
+        self.rgba = None  # буфер RGBA нужного размера
+        self.image = None  # PIL.Image поверх буфера rgba без копирования
+
+    def _target_size(self, frame):
+        frame_h, frame_w = frame.shape[:2]
+        canvas_w = self.canvas.winfo_width()
+        canvas_h = self.canvas.winfo_height()
+        if canvas_w <= 1 or canvas_h <= 1:
+            # Холст еще не отображен
+            return frame_w, frame_h
+        scale = min(canvas_w / frame_w, canvas_h / frame_h)
+        return max(1, int(frame_w * scale)), max(1, int(frame_h * scale))
+
+    def _allocate(self, size):
+        width, height = size
+        self.size = size
+        self.resized = np.empty((height, width, 3), dtype=np.uint8)
+        self.rgba = np.empty((height, width, 4), dtype=np.uint8)
+        self.image = Image.frombuffer("RGBA", size, self.rgba, "raw", "RGBA", 0, 1)
+        self.photo = ImageTk.PhotoImage(image=self.image)
+        if self.item is None:
+            self.item = self.canvas.create_image(0, 0, anchor="center", image=self.photo)
+        else:
+            self.canvas.itemconfig(self.item, image=self.photo)
+        # Ссылка на PhotoImage, иначе Tk удалит изображение
+        self.canvas.imgtk = self.photo
+
+    def show(self, frame):
+        size = self._target_size(frame)
+        if size != self.size:
+            self._allocate(size)
+        source = frame
+        if (frame.shape[1], frame.shape[0]) != size:
+            cv2.resize(frame, size, dst=self.resized, interpolation=self.interpolation)
+            source = self.resized
+        cv2.cvtColor(source, cv2.COLOR_BGR2RGBA, dst=self.rgba)
+        self.photo.paste(self.image)
+        canvas_w = max(self.canvas.winfo_width(), size[0])
+        canvas_h = max(self.canvas.winfo_height(), size[1])
+        self.canvas.coords(self.item, canvas_w // 2, canvas_h // 2)
+        self.canvas.itemconfig(self.item, state="normal")
+
+    def clear(self):
+        if self.item is not None:
+            self.canvas.itemconfig(self.item, state="hidden")
+
+    def close(self):
+        pass
+
+
+class CvWindowDisplay:
+    """Вывод кадров в окно OpenCV (с OpenGL, если сборка его поддерживает).
+
+    Подходит для наблюдения с высокой частотой кадров: кадр передается в
+    окно без перевода цветов и без PIL.
+    """
+
+    def __init__(self, name="Webcam Viewer"):
+        self.name = name
+        self.opened = False
+
+    def _open(self):
+        try:
+            cv2.namedWindow(self.name, cv2.WINDOW_NORMAL | cv2.WINDOW_OPENGL)
+        except cv2.error:
+            cv2.namedWindow(self.name, cv2.WINDOW_NORMAL)
+        self.opened = True
+
+    def show(self, frame):
+        if not self.opened:
+            self._open()
+        cv2.imshow(self.name, frame)
+        cv2.waitKey(1)
+
+    def clear(self):
+        self.close()
+
+    def close(self):
+        if self.opened:
+            cv2.destroyWindow(self.name)
+            self.opened = False
+
+
+def create_display(kind, canvas=None):
+    # kind: "tk" (холст окна приложения) или "opencv" (отдельное окно OpenCV)
+    if kind == "tk":
+        return TkDisplay(canvas)
+    if kind == "opencv":
+        return CvWindowDisplay()
+    raise ValueError(f"Неизвестный способ вывода: {kind}")
@@ -0,0 +1,148 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class EventClipBuffer:
+    """Кольцевой буфер последних кадров в JPEG для сохранения клипов событий.
+
+    Кадры сжимаются в фоновом потоке и хранятся, пока их суммарный размер
+    не превышает byte_budget_mb. По trigger сохраняется клип от
+    T - pre_seconds до T + post_seconds: когда кадры после события
+    накоплены, клип декодируется и записывается в отдельном потоке в файл
+    <base_filename>.avi рядом со снимком и JSON. trigger может прийти
+    позже самого события, но не более чем на max_delay секунд.
+    """
+
+    def __init__(self, output_dir="result_images", pre_seconds=5.0, post_seconds=5.0, byte_budget_mb=64,
+                 jpeg_quality=80, classes=None, max_delay=0.0):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_delay = max_delay
+        self.byte_budget = byte_budget_mb * 1024 * 1024
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.classes = set(classes) if classes else None  # None - все классы
+        self.lock = threading.Lock()
+
+        self.frames = deque()  # (время, JPEG)
+        self.bytes = 0
+        self.pending = []  # (время события, base_filename)
+
+        # Счетчики
+        self.encoded = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.clips = 0
+        self.error = None
+
+        self.encode_queue = queue.Queue(maxsize=8)
+        self.clip_queue = queue.Queue()
+        self.encoder = threading.Thread(target=self._encode_loop, name="EventClipEncoder", daemon=True)
+        self.clip_writer = threading.Thread(target=self._clip_loop, name="EventClipWriter", daemon=True)
+        self.encoder.start()
+        self.clip_writer.start()
+
+    def wants(self, label):
+        return self.classes is None or label in self.classes
+
+    def add(self, frame, timestamp=None):
+        # Вызывается на каждом кадре; сжатие выполняется в фоне
+        timestamp = time.time() if timestamp is None else timestamp
+        try:
+            self.encode_queue.put_nowait((timestamp, frame))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def trigger(self, base_filename, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            self.pending.append((timestamp, base_filename))
+
+    def _encode_loop(self):
+        while True:
+            item = self.encode_queue.get()
+            if item is None:
+                break
+            timestamp, frame = item
+            ok, jpeg = cv2.imencode(".jpg", frame, self.encode_params)
+            if not ok:
+                continue
+            with self.lock:
+                self.frames.append((timestamp, jpeg))
+                self.bytes += jpeg.nbytes
+                self.encoded += 1
+                self._release_ready(timestamp)
+                self._evict(timestamp)
+
+    def _release_ready(self, now, force=False):
+        # Клипы, для которых уже есть все кадры после события
+        ready = [event for event in self.pending if force or now >= event[0] + self.post_seconds]
+        for event_time, base_filename in ready:
+            self.pending.remove((event_time, base_filename))
+            start, end = event_time - self.pre_seconds, event_time + self.post_seconds
+            clip = [(t, jpeg) for t, jpeg in self.frames if start <= t <= end]
+            if clip:
+                self.clip_queue.put((base_filename, clip))
+
+    def _evict(self, now):
+        # Кадры старше pre_seconds (+ max_delay) нужны только ожидающим клипам
+        oldest_needed = min([event_time for event_time, _ in self.pending] + [now - self.max_delay]) - self.pre_seconds
+        while self.frames and (self.frames[0][0] < oldest_needed or self.bytes > self.byte_budget):
+            _, jpeg = self.frames.popleft()
+            self.bytes -= jpeg.nbytes
+            self.evicted += 1
+
+    def _clip_loop(self):
+        while True:
+            item = self.clip_queue.get()
+            if item is None:
+                break
+            base_filename, clip = item
+            try:
+                self._write_clip(base_filename, clip)
+                with self.lock:
+                    self.clips += 1
+            except Exception as e:
+                self.error = e
+
+    def _write_clip(self, base_filename, clip):
+        duration = clip[-1][0] - clip[0][0]
+        fps = (len(clip) - 1) / duration if duration > 0 else 10.0
+        first = cv2.imdecode(clip[0][1], cv2.IMREAD_COLOR)
+        height, width = first.shape[:2]
+        filename = os.path.join(self.output_dir, f"{base_filename}.avi")
+        writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+        try:
+            writer.write(first)
+            for _, jpeg in clip[1:]:
+                writer.write(cv2.imdecode(jpeg, cv2.IMREAD_COLOR))
+        finally:
+            writer.release()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "frames": len(self.frames),
+                "memory_mb": round(self.bytes / (1024 * 1024), 1),
+                "pending_clips": len(self.pending),
+                "clips": self.clips,
+                "encoded": self.encoded,
+                "dropped": self.dropped,
+                "evicted": self.evicted,
+            }
+
+    def close(self):
+        # Сохраняет ожидающие клипы с уже накопленными кадрами
+        self.encode_queue.put(None)
+        self.encoder.join()
+        with self.lock:
+            self._release_ready(time.time(), force=True)
+        self.clip_queue.put(None)
+        self.clip_writer.join()
@@ -0,0 +1,70 @@
+import argparse
+import glob
+import os
+import time
+
+from model_registry import PYTORCH_EXTENSIONS, load_yolo, warm_up
+
+
+def export_model(path, formats, imgsz=640, half=False, int8=False):
+    # Экспорт одной модели .pt во все указанные форматы. Файлы экспорта
+    # создаются рядом с исходной моделью: yolov8n.onnx, yolov8n_openvino_model/
+    from ultralytics import YOLO
+
+    exported = []
+    for fmt in formats:
+        model = YOLO(path)
+        kwargs = {"format": fmt, "imgsz": imgsz}
+        if fmt == "openvino":
+            kwargs.update(half=half, int8=int8)
+        exported.append(model.export(**kwargs))
+    return exported
+
+
+def measure(path, runs=20, imgsz=640):
+    # Среднее время одного вызова модели на пустом кадре, мс
+    import numpy as np
+
+    model = load_yolo(path)
+    warm_up(model, imgsz)
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    for _ in range(runs):
+        model.predict(dummy, imgsz=imgsz, verbose=False)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт моделей .pt в ONNX и OpenVINO для работы на CPU")
+    parser.add_argument("models", nargs="*", help="модели .pt (по умолчанию все из neural_network_models)")
+    parser.add_argument("--format", nargs="+", choices=["onnx", "openvino"], default=["onnx", "openvino"],
+                        dest="formats")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--half", action="store_true", help="OpenVINO FP16")
+    parser.add_argument("--int8", action="store_true", help="OpenVINO INT8")
+    parser.add_argument("--compare", action="store_true", help="сравнить скорость исходной и экспортированных моделей")
+    args = parser.parse_args()
+
+    models = args.models
+    if not models:
+        models = [path for ext in PYTORCH_EXTENSIONS for path in glob.glob(f"neural_network_models/*{ext}")]
+    if not models:
+        print("Модели .pt не найдены.")
+        return
+
+    for path in models:
+        print(f"Экспорт {path} -> {', '.join(args.formats)}")
+        try:
+            exported = export_model(path, args.formats, args.imgsz, args.half, args.int8)
+        except Exception as e:
+            print(f"Ошибка экспорта {path}: {e}")
+            continue
+        for exported_path in exported:
+            print(f"  {exported_path}")
+        if args.compare:
+            for candidate in [path] + [str(p) for p in exported]:
+                print(f"  {os.path.basename(candidate)}: {measure(candidate, imgsz=args.imgsz):.1f} мс/кадр")
+
+
+if __name__ == "__main__":
+    main()
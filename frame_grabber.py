@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class FrameGrabber:
+    """Захват кадров с камеры в фоновом потоке.
+
+    Хранит только последние кадры в ограниченном кольцевом буфере: если
+    потребитель не успевает, самые старые кадры вытесняются и учитываются
+    как пропущенные. Интерфейс повторяет cv2.VideoCapture (isOpened, read,
+    get, release), поэтому объект можно подставить вместо self.vid.
+    Если передан metrics (PipelineMetrics), время чтения кадра
+    записывается как этап "capture". Время захвата (time.time()) последних
+    time_history кадров доступно по capture_time(frame_id), чтобы события
+    привязывались к моменту съемки, а не к моменту обработки.
+    """
+
+    def __init__(self, source, buffer_size=2, realtime=None, metrics=None, time_history=256):
+        self.source = source
+        self.metrics = metrics
+        self.cap = cv2.VideoCapture(source)
+        # Видеофайл воспроизводится с его собственной частотой кадров,
+        # чтобы он вел себя как камера
+        if realtime is None:
+            realtime = isinstance(source, str)
+        file_fps = self.cap.get(cv2.CAP_PROP_FPS) if realtime else 0
+        self.frame_interval = 1.0 / file_fps if file_fps and file_fps > 0 else 0.0
+        self.buffer = deque(maxlen=buffer_size)
+        self.time_history = time_history
+        self.capture_times = {}  # frame_id -> time.time() захвата
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+
+        # Счетчики
+        self.frame_id = 0  # идентификатор последнего захваченного кадра
+        self.last_read_id = 0  # идентификатор последнего отданного кадра
+        self.grabbed = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.fps = 0.0
+        self._last_grab_time = None
+
+        self.running = self.cap.isOpened()
+        self.thread = None
+        if self.running:
+            self.thread = threading.Thread(target=self._run, name=f"FrameGrabber-{source}", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        next_time = time.perf_counter()
+        while self.running:
+            if self.frame_interval:
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_time = max(next_time + self.frame_interval, time.perf_counter() - self.frame_interval)
+            read_start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if ret and self.metrics:
+                self.metrics.record("capture", time.perf_counter() - read_start)
+                self.metrics.tick("capture")
+            if not ret:
+                # Камера отключена или файл закончился
+                self.running = False
+                with self.lock:
+                    self.new_frame.notify_all()
+                break
+
+            now = time.perf_counter()
+            captured_at = time.time()
+            with self.lock:
+                if self._last_grab_time is not None:
+                    # Экспоненциальное сглаживание реальной частоты камеры
+                    instant_fps = 1.0 / max(now - self._last_grab_time, 1e-6)
+                    self.fps = instant_fps if self.fps == 0.0 else 0.9 * self.fps + 0.1 * instant_fps
+                self._last_grab_time = now
+
+                # При заполненном буфере самый старый кадр вытесняется
+                if len(self.buffer) == self.buffer.maxlen:
+                    oldest_id, _ = self.buffer[0]
+                    if oldest_id > self.last_read_id:
+                        self.dropped += 1
+                self.frame_id += 1
+                self.grabbed += 1
+                self.buffer.append((self.frame_id, frame))
+                self.capture_times[self.frame_id] = captured_at
+                self.capture_times.pop(self.frame_id - self.time_history, None)
+                self.new_frame.notify_all()
+
+    def isOpened(self):
+        return self.running
+
+    def read_latest(self, timeout=None):
+        # Возвращает (frame_id, frame) самого свежего кадра или (None, None).
+        # С timeout ожидает кадр новее уже отданного.
+        with self.lock:
+            if timeout is not None:
+                self.new_frame.wait_for(
+                    lambda: not self.running or (self.buffer and self.buffer[-1][0] > self.last_read_id),
+                    timeout=timeout)
+            if not self.buffer:
+                return None, None
+            frame_id, frame = self.buffer[-1]
+            if frame_id > self.last_read_id:
+                # Кадры между последним отданным и текущим так и не были показаны
+                skipped = sum(1 for fid, _ in self.buffer if self.last_read_id < fid < frame_id)
+                self.dropped += skipped
+                self.delivered += 1
+                self.last_read_id = frame_id
+            return frame_id, frame
+
+    def capture_time(self, frame_id):
+        # Время захвата кадра (time.time()) или None, если кадр слишком старый
+        with self.lock:
+            return self.capture_times.get(frame_id)
+
+    def read(self):
+        frame_id, frame = self.read_latest()
+        return frame is not None, frame
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "grabbed": self.grabbed,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "fps": round(self.fps, 1),
+            }
+
+    def release(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.cap.release()
@@ -0,0 +1,172 @@
+import argparse
+import os
+import xml.etree.ElementTree as ET
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+
+from location_service import parse_nmea
+
+GPX_EXTENSIONS = (".gpx",)
+
+
+def parse_time(value):
+    # Время GPX (ISO 8601, обычно UTC с суффиксом Z) в секунды Unix
+    moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def read_gpx(path):
+    # Потоковый разбор: точки складываются в компактные массивы double,
+    # а разобранная точка удаляется из родителя (trkseg), так что дерево
+    # не растет с числом точек
+    times, lats, lons = array("d"), array("d"), array("d")
+    parents = []  # открытые элементы от корня до текущего
+    for event, element in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag.rsplit("}", 1)[-1] != "trkpt":
+            continue
+        time_element = next((child for child in element if child.tag.rsplit("}", 1)[-1] == "time"), None)
+        if time_element is not None and time_element.text:
+            times.append(parse_time(time_element.text))
+            lats.append(float(element.get("lat")))
+            lons.append(float(element.get("lon")))
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
+    return times, lats, lons
+
+
+def read_nmea(path):
+    # Сообщения RMC (в них есть дата и время) с действительной фиксацией
+    times, lats, lons = array("d"), array("d"), array("d")
+    with open(path, encoding="ascii", errors="ignore") as f:
+        for line in f:
+            if "RMC" not in line[:7]:
+                continue
+            fix = parse_nmea(line)
+            if fix and fix[0] is not None and fix[1] is not None and fix[2] is not None:
+                times.append(fix[0].timestamp())
+                lats.append(fix[1])
+                lons.append(fix[2])
+    return times, lats, lons
+
+
+def as_numpy(values):
+    return np.frombuffer(values, dtype=np.float64) if len(values) else np.empty(0)
+
+
+class GpsTrack:
+    """Трек GPS как отсортированные массивы numpy (время, широта, долгота).
+
+    positions(t) для массива моментов времени ищет соседние точки
+    np.searchsorted и интерполирует координаты линейно; моменты вне
+    трека или внутри разрыва длиннее max_gap секунд получают NaN.
+    offset (секунды) прибавляется ко времени кадра, если часы
+    видеорегистратора и GPS расходятся.
+    """
+
+    def __init__(self, times, lats, lons, max_gap=10.0, offset=0.0):
+        times = np.asarray(times, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if len(times) > 1 and np.any(np.diff(times) < 0):
+            order = np.argsort(times, kind="stable")
+            times, lats, lons = times[order], lats[order], lons[order]
+        self.times = times
+        self.lats = lats
+        self.lons = lons
+        self.max_gap = max_gap
+        self.offset = offset
+
+    @classmethod
+    def from_file(cls, path, max_gap=10.0, offset=0.0, cache=True):
+        # Разобранный трек сохраняется рядом с журналом (<путь>.npz) и при
+        # следующих запусках загружается из него, пока журнал не изменится
+        cache_path = path + ".npz"
+        if cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            with np.load(cache_path) as data:
+                return cls(data["times"], data["lats"], data["lons"], max_gap, offset)
+        if path.lower().endswith(GPX_EXTENSIONS):
+            times, lats, lons = read_gpx(path)
+        else:
+            times, lats, lons = read_nmea(path)
+        # Массивы array("d") переходят в numpy без копирования по точкам
+        track = cls(as_numpy(times), as_numpy(lats), as_numpy(lons), max_gap, offset)
+        if cache:
+            try:
+                np.savez(cache_path, times=track.times, lats=track.lats, lons=track.lons)
+            except OSError:
+                pass
+        return track
+
+    def __len__(self):
+        return len(self.times)
+
+    def time_range(self):
+        if not len(self.times):
+            return None
+        return self.times[0], self.times[-1]
+
+    def positions(self, timestamps):
+        # Массивы широт и долгот для массива моментов (секунды Unix)
+        t = np.asarray(timestamps, dtype=np.float64) + self.offset
+        lats = np.full(t.shape, np.nan)
+        lons = np.full(t.shape, np.nan)
+        if len(self.times) < 2:
+            if len(self.times) == 1:
+                near = np.abs(t - self.times[0]) <= self.max_gap
+                lats[near], lons[near] = self.lats[0], self.lons[0]
+            return lats, lons
+
+        right = np.clip(np.searchsorted(self.times, t, side="right"), 1, len(self.times) - 1)
+        left = right - 1
+        t0, t1 = self.times[left], self.times[right]
+        span = t1 - t0
+        k = np.divide(t - t0, span, out=np.zeros_like(t), where=span > 0)
+        valid = (t >= t0) & (t <= t1) & (span <= self.max_gap)
+
+        # За концами трека - ближайшая точка, если она не дальше max_gap
+        before = (t < self.times[0]) & (self.times[0] - t <= self.max_gap)
+        after = (t > self.times[-1]) & (t - self.times[-1] <= self.max_gap)
+        k = np.where(before, 0.0, np.where(after, 1.0, k))
+        valid |= before | after
+
+        lats[valid] = (self.lats[left] + (self.lats[right] - self.lats[left]) * k)[valid]
+        lons[valid] = (self.lons[left] + (self.lons[right] - self.lons[left]) * k)[valid]
+        return lats, lons
+
+    def position(self, timestamp):
+        lats, lons = self.positions([timestamp])
+        if np.isnan(lats[0]):
+            return None
+        return float(lats[0]), float(lons[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Индекс трека GPS (GPX или NMEA) и поиск координат по времени")
+    parser.add_argument("path", help="файл .gpx или журнал NMEA")
+    parser.add_argument("--at", nargs="*", default=[],
+                        help='моменты "YYYY-mm-dd HH:MM:SS" (местное время) для вывода координат')
+    parser.add_argument("--max-gap", type=float, default=10.0)
+    args = parser.parse_args()
+
+    started = datetime.now()
+    track = GpsTrack.from_file(args.path, args.max_gap)
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Точек: {len(track)}, загрузка {elapsed:.2f} с")
+    time_range = track.time_range()
+    if time_range:
+        print(f"С {datetime.fromtimestamp(time_range[0])} по {datetime.fromtimestamp(time_range[1])}")
+    for value in args.at:
+        print(f"{value}: {track.position(datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp())}")
+
+
+if __name__ == "__main__":
+    main()
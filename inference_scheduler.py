@@ -0,0 +1,117 @@
+import math
+import time
+
+
+class InferenceScheduler:
+    """Решает, на каком кадре запускать нейросеть.
+
+    Бюджет времени на кадр равен 1 / target_fps. Если измеренная задержка
+    model.track больше бюджета, нейросеть запускается на каждом N-м кадре,
+    где N = ceil(задержка / бюджет). Независимо от N между запусками
+    проходит не больше max_latency секунд.
+    """
+
+    def __init__(self, target_fps=15.0, max_latency=0.5, max_skip=10, smoothing=0.2):
+        self.frame_budget = 1.0 / target_fps
+        self.max_latency = max_latency
+        self.max_skip = max_skip
+        self.smoothing = smoothing
+        self.latency = 0.0  # сглаженное время model.track, с
+        self.interval = 1
+        self.frames_since_run = 0
+        self.last_run_time = None
+        self.runs = 0
+        self.skipped = 0
+
+    def should_run(self, now=None):
+        now = time.perf_counter() if now is None else now
+        run = (self.last_run_time is None
+               or self.frames_since_run + 1 >= self.interval
+               or now - self.last_run_time >= self.max_latency)
+        if run:
+            self.frames_since_run = 0
+            self.last_run_time = now
+            self.runs += 1
+        else:
+            self.frames_since_run += 1
+            self.skipped += 1
+        return run
+
+    def record(self, latency):
+        # Обновление сглаженной задержки и интервала запуска
+        if self.latency == 0.0:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+        interval = math.ceil(self.latency / self.frame_budget) if self.latency > 0 else 1
+        self.interval = max(1, min(interval, self.max_skip))
+
+    def stats(self):
+        return {
+            "latency_ms": round(self.latency * 1000, 1),
+            "interval": self.interval,
+            "runs": self.runs,
+            "skipped": self.skipped,
+        }
+
+
+class MotionPredictor:
+    """Продление треков на кадрах без нейросети.
+
+    Для каждого трека хранится последняя позиция центра и скорость
+    (пикселей за кадр), на пропущенных кадрах позиция экстраполируется
+    линейно. Трек, не наблюдавшийся дольше max_gap кадров, забывается.
+    Размер рамки, класс и уверенность последнего наблюдения хранятся,
+    чтобы на пропущенных кадрах рисовать рамки в предсказанных позициях.
+    """
+
+    def __init__(self, smoothing=0.5, max_gap=15):
+        self.smoothing = smoothing
+        self.max_gap = max_gap
+        self.tracks = {}  # track_id -> [x, y, vx, vy, кадров с последнего наблюдения]
+        self.sizes = {}  # track_id -> (w, h, cls, conf)
+
+    def observe(self, track_id, x, y, w=None, h=None, cls=None, conf=None):
+        if w is not None and h is not None:
+            self.sizes[track_id] = (w, h, cls, conf)
+        state = self.tracks.get(track_id)
+        if state is None:
+            self.tracks[track_id] = [x, y, 0.0, 0.0, 0]
+            return
+        # Смещение от последней наблюдаемой позиции, а не от предсказанной
+        last_x = state[0] - state[2] * state[4]
+        last_y = state[1] - state[3] * state[4]
+        steps = state[4] + 1
+        vx = (x - last_x) / steps
+        vy = (y - last_y) / steps
+        state[2] += self.smoothing * (vx - state[2])
+        state[3] += self.smoothing * (vy - state[3])
+        state[0], state[1], state[4] = x, y, 0
+
+    def predict(self):
+        # Сдвигает все активные треки на один кадр, возвращает [(track_id, x, y)]
+        predicted = []
+        for track_id, state in list(self.tracks.items()):
+            if state[4] >= self.max_gap:
+                # Устаревшее предсказание больше не показывается
+                del self.tracks[track_id]
+                self.sizes.pop(track_id, None)
+                continue
+            state[0] += state[2]
+            state[1] += state[3]
+            state[4] += 1
+            predicted.append((track_id, state[0], state[1]))
+        return predicted
+
+    def boxes(self, predicted):
+        # Рамки (x, y, w, h, cls, conf, track_id) для результата predict
+        return [(x, y) + self.sizes[track_id] + (track_id,) for track_id, x, y in predicted
+                if track_id in self.sizes]
+
+    def retain(self, track_ids):
+        # Забыть треки, которых нет в последнем результате нейросети
+        keep = set(track_ids)
+        for track_id in list(self.tracks):
+            if track_id not in keep:
+                del self.tracks[track_id]
+                self.sizes.pop(track_id, None)
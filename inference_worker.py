@@ -0,0 +1,123 @@
+import queue
+import threading
+
+from roi_preprocess import RoiPreprocessor
+
+
+def record_track_timing(metrics, results, seconds):
+    # ultralytics сообщает время пред-, постобработки и сети в мс;
+    # остаток времени model.track приходится на трекер
+    speed = getattr(results[0], "speed", None) or {}
+    measured = 0.0
+    for stage in ("preprocess", "inference", "postprocess"):
+        if speed.get(stage) is not None:
+            metrics.record(stage, speed[stage] / 1000)
+            measured += speed[stage] / 1000
+    metrics.record("tracking", max(seconds - measured, 0.0))
+    metrics.tick("inference")
+
+
+class InferenceWorker:
+    """Выполняет model.track в отдельном потоке.
+
+    Кадры поступают через ограниченную очередь: если модель не успевает,
+    самый старый ожидающий кадр выбрасывается. Последний результат
+    публикуется вместе с идентификатором кадра, к которому он относится.
+    Если передан metrics, время model.track раскладывается на этапы
+    preprocess/inference/postprocess (по Results.speed) и tracking.
+    Если передан preprocess (RoiPreprocessor), в модель подается
+    вырезанная и уменьшенная область, а рамки результата переводятся
+    обратно в координаты полного кадра.
+    """
+
+    def __init__(self, model, queue_size=1, metrics=None, preprocess=None, **track_kwargs):
+        self.model = model
+        self.metrics = metrics
+        self.preprocess = preprocess or RoiPreprocessor()
+        self.track_kwargs = {"persist": True, "verbose": False}
+        self.track_kwargs.update(track_kwargs)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+
+        self.result_frame_id = None
+        self.results = None
+        self.error = None
+
+        # Счетчики
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.latency = 0.0  # время последнего вызова model.track, с
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="InferenceWorker", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame_id, frame):
+        # Возвращает False, если ради нового кадра пришлось выбросить старый
+        accepted = True
+        while True:
+            try:
+                self.queue.put_nowait((frame_id, frame))
+                break
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    accepted = False
+                    with self.lock:
+                        self.dropped += 1
+                except queue.Empty:
+                    pass
+        with self.lock:
+            self.submitted += 1
+        return accepted
+
+    def _run(self):
+        while self.running:
+            try:
+                item = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            frame_id, frame = item
+            try:
+                results = self.preprocess.track(self.model, frame, self.metrics, **self.track_kwargs)
+            except Exception as e:
+                with self.lock:
+                    self.error = e
+                continue
+            latency = self.preprocess.latency
+            if self.metrics:
+                record_track_timing(self.metrics, results, latency)
+            with self.lock:
+                self.latency = latency
+                self.result_frame_id = frame_id
+                self.results = results
+                self.processed += 1
+
+    def latest(self):
+        # Возвращает (frame_id, results) последнего обработанного кадра
+        with self.lock:
+            return self.result_frame_id, self.results
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "latency_ms": round(self.latency * 1000, 1),
+            }
+
+    def stop(self):
+        self.running = False
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
@@ -1,19 +1,19 @@
-import cv2
+from camera_discovery import CameraDiscovery
 
 def list_available_cameras():
-    max_cameras_to_check = 10  # Максимальное количество камер для проверки
-    available_cameras = []
+    # Устройства опрашиваются параллельно с ограничением по времени
+    discovery = CameraDiscovery(probe_timeout=3.0)
+    available_cameras = discovery.scan()
 
-    for i in range(max_cameras_to_check):
-        cap = cv2.VideoCapture(i)
-        if cap.isOpened():
-            available_cameras.append(i)
-            print(f"Камера {i} доступна.")
-        cap.release()
+    for info in available_cameras:
+        resolutions = ", ".join(f"{w}x{h}" for w, h in info.resolutions) or "нет данных"
+        print(f"Камера {info.describe()} доступна (разрешения: {resolutions}; опрос {info.probe_seconds} с).")
 
     if not available_cameras:
         print("Нет доступных камер.")
     else:
-        print(f"Доступные камеры: {available_cameras}")
+        print(f"Доступные камеры: {[info.index for info in available_cameras]}")
+    if discovery.timeouts:
+        print(f"Не ответили за отведенное время: {discovery.timeouts}")
 
 list_available_cameras()
@@ -0,0 +1,284 @@
+import bisect
+import csv
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def nmea_to_degrees(value, hemisphere):
+    # NMEA: ddmm.mmmm (широта) и dddmm.mmmm (долгота)
+    if not value:
+        return None
+    dot = value.index(".") if "." in value else len(value)
+    degrees = float(value[:dot - 2]) + float(value[dot - 2:]) / 60
+    return -degrees if hemisphere in ("S", "W") else degrees
+
+
+def parse_nmea(line):
+    # Возвращает (время UTC или None, широта, долгота) для RMC/GGA с фиксацией, иначе None
+    line = line.strip()
+    if not line.startswith("$") or len(line) < 7:
+        return None
+    fields = line.split("*")[0].split(",")
+    kind = fields[0][3:]
+    try:
+        if kind == "RMC" and len(fields) >= 10 and fields[2] == "A":
+            lat = nmea_to_degrees(fields[3], fields[4])
+            lon = nmea_to_degrees(fields[5], fields[6])
+            moment = None
+            if fields[1] and fields[9]:
+                moment = datetime.strptime(fields[9] + fields[1].split(".")[0], "%d%m%y%H%M%S")
+                moment = moment.replace(tzinfo=timezone.utc)
+                if "." in fields[1]:
+                    moment = moment.replace(microsecond=int(float("0." + fields[1].split(".")[1]) * 1e6))
+            return moment, lat, lon
+        if kind == "GGA" and len(fields) >= 7 and fields[6] not in ("", "0"):
+            return None, nmea_to_degrees(fields[2], fields[3]), nmea_to_degrees(fields[4], fields[5])
+    except ValueError:
+        return None
+    return None
+
+
+class PositionCache:
+    """Координаты с отметками времени, упорядоченные по времени.
+
+    position(t) ищет соседние точки двоичным поиском и интерполирует
+    координаты линейно. Если t вне диапазона, берется ближайшая точка,
+    но не дальше max_gap секунд; между точками, разнесенными больше чем
+    на max_gap, интерполяция тоже не выполняется.
+    """
+
+    def __init__(self, max_points=36000, max_gap=10.0):
+        self.max_points = max_points
+        self.max_gap = max_gap
+        self.lock = threading.Lock()
+        self.times = []
+        self.coords = []  # (широта, долгота)
+
+    def add(self, timestamp, lat, lon):
+        with self.lock:
+            if not self.times or timestamp >= self.times[-1]:
+                self.times.append(timestamp)
+                self.coords.append((lat, lon))
+            else:
+                index = bisect.bisect_right(self.times, timestamp)
+                self.times.insert(index, timestamp)
+                self.coords.insert(index, (lat, lon))
+            if len(self.times) > self.max_points * 2:
+                # Удаление старой половины разом, а не по одной точке
+                del self.times[:-self.max_points]
+                del self.coords[:-self.max_points]
+
+    def position(self, timestamp):
+        with self.lock:
+            if not self.times:
+                return None
+            index = bisect.bisect_left(self.times, timestamp)
+            if index < len(self.times) and self.times[index] == timestamp:
+                return self.coords[index]
+            if index == 0 or index == len(self.times):
+                nearest = 0 if index == 0 else len(self.times) - 1
+                if abs(self.times[nearest] - timestamp) <= self.max_gap:
+                    return self.coords[nearest]
+                return None
+            t0, t1 = self.times[index - 1], self.times[index]
+            if t1 - t0 > self.max_gap:
+                return None
+            k = (timestamp - t0) / (t1 - t0)
+            (lat0, lon0), (lat1, lon1) = self.coords[index - 1], self.coords[index]
+            return lat0 + (lat1 - lat0) * k, lon0 + (lon1 - lon0) * k
+
+    def __len__(self):
+        with self.lock:
+            return len(self.times)
+
+
+class NmeaSource:
+    """Приемник GPS: строки NMEA из последовательного порта или файла.
+
+    Для порта нужен pyserial. Время точки по умолчанию - время приема
+    строки (в той же шкале, что и время обнаружений); device_time=True
+    берет время из сообщения RMC. Файл читается один раз (one_shot):
+    точки записанного журнала совпадают по времени только с обнаружениями
+    того же времени (проверки, обработка записей), а не с живой камерой.
+    """
+
+    # Точность GPS достаточна для отсечения повторов дефектов по месту
+    precise = True
+
+    def __init__(self, path, baudrate=4800, device_time=False):
+        self.path = path
+        self.baudrate = baudrate
+        self.device_time = device_time
+
+    @property
+    def one_shot(self):
+        return os.path.isfile(self.path)
+
+    def _add(self, cache, line):
+        fix = parse_nmea(line)
+        if fix is None or fix[1] is None or fix[2] is None:
+            return
+        moment, lat, lon = fix
+        timestamp = moment.timestamp() if self.device_time and moment else time.time()
+        cache.add(timestamp, lat, lon)
+
+    def run(self, cache, stop_event):
+        if os.path.isfile(self.path):
+            with open(self.path, encoding="ascii", errors="ignore") as f:
+                for line in f:
+                    if stop_event.is_set():
+                        break
+                    self._add(cache, line)
+            return
+        import serial
+        with serial.Serial(self.path, self.baudrate, timeout=1.0) as port:
+            while not stop_event.is_set():
+                self._add(cache, port.readline().decode("ascii", errors="ignore"))
+
+
+class IpSource:
+    """Приблизительные координаты по IP (geocoder), запрос раз в ttl секунд."""
+
+    # Одна точка на километры вокруг: для отсечения повторов не годится
+    precise = False
+
+    def __init__(self, ttl=600.0, retry=30.0):
+        self.ttl = ttl
+        self.retry = retry
+
+    def run(self, cache, stop_event):
+        import geocoder
+        while not stop_event.is_set():
+            latlng = None
+            try:
+                latlng = geocoder.ip("me").latlng
+            except Exception:
+                pass
+            if latlng:
+                cache.add(time.time(), latlng[0], latlng[1])
+            stop_event.wait(self.ttl if latlng else self.retry)
+
+
+class ReplaySource:
+    """Точки из файла CSV (timestamp,lat,lon), JSONL или NMEA (для проверок).
+
+    Время в файле - секунды Unix. С realtime=True точки добавляются
+    по мере наступления их времени, иначе все сразу.
+    """
+
+    one_shot = True
+    precise = True
+
+    def __init__(self, path, realtime=False):
+        self.path = path
+        self.realtime = realtime
+
+    def points(self):
+        with open(self.path, encoding="utf-8") as f:
+            if self.path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        data = json.loads(line)
+                        yield float(data["timestamp"]), float(data["lat"]), float(data["lon"])
+            elif self.path.endswith((".nmea", ".log", ".txt")):
+                for line in f:
+                    fix = parse_nmea(line)
+                    if fix and fix[0] and fix[1] is not None:
+                        yield fix[0].timestamp(), fix[1], fix[2]
+            else:
+                for row in csv.reader(f):
+                    if row and not row[0].startswith(("#", "timestamp")):
+                        yield float(row[0]), float(row[1]), float(row[2])
+
+    def run(self, cache, stop_event):
+        for timestamp, lat, lon in self.points():
+            if stop_event.is_set():
+                break
+            if self.realtime:
+                delay = timestamp - time.time()
+                if delay > 0 and stop_event.wait(delay):
+                    break
+            cache.add(timestamp, lat, lon)
+
+
+def create_location_source(spec):
+    # "ip", "nmea:/dev/ttyUSB0", "replay:points.csv" или None (файл в "nmea:" читается один раз)
+    if not spec:
+        return None
+    kind, _, path = spec.partition(":")
+    if kind == "ip":
+        return IpSource()
+    if kind == "nmea":
+        # У записанного файла время берется из сообщений, у порта - время приема
+        return NmeaSource(path, device_time=os.path.isfile(path))
+    if kind == "replay":
+        return ReplaySource(path)
+    raise ValueError(f"Неизвестный источник координат: {spec}")
+
+
+class LocationService:
+    """Фоновое получение координат для метаданных обнаружений.
+
+    Источник работает в своем потоке и пополняет PositionCache;
+    position(t) только читает кэш и никогда не ждет сеть или порт.
+    Ошибка источника сохраняется в error, после чего через retry секунд
+    источник перезапускается; источник-файл (one_shot) читается один раз.
+    """
+
+    def __init__(self, source, max_gap=10.0, retry=5.0):
+        self.source = source
+        self.retry = retry
+        # Для IP-координат время точки - время запроса, поэтому допуск равен ttl
+        gap = max(max_gap, getattr(source, "ttl", 0) * 2)
+        self.cache = PositionCache(max_gap=gap)
+        self.stop_event = threading.Event()
+        self.error = None
+        self.lookups = 0
+        self.misses = 0
+        self.thread = threading.Thread(target=self._run, name="LocationService", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.source.run(self.cache, self.stop_event)
+            except Exception as e:
+                self.error = e
+            if getattr(self.source, "one_shot", False):
+                break
+            self.stop_event.wait(self.retry)
+
+    @property
+    def precise(self):
+        # Подходят ли координаты источника для отсечения повторов по месту
+        return getattr(self.source, "precise", False)
+
+    def position(self, timestamp=None):
+        # (широта, долгота) на момент timestamp (time.time()) или None
+        position = self.cache.position(time.time() if timestamp is None else timestamp)
+        self.lookups += 1
+        if position is None:
+            self.misses += 1
+        return position
+
+    def fields(self, timestamp=None):
+        # Поля Latitude/Longitude для метаданных обнаружения
+        position = self.position(timestamp)
+        if position is None:
+            return {"Latitude": "N/A", "Longitude": "N/A"}
+        return {"Latitude": round(position[0], 7), "Longitude": round(position[1], 7)}
+
+    def stats(self):
+        return {
+            "points": len(self.cache),
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "error": str(self.error) if self.error else None,
+        }
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=1.0)
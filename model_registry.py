@@ -0,0 +1,203 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+
+# Форматы моделей: веса PyTorch, экспорт ONNX (ONNX Runtime) и папки
+# экспорта OpenVINO. Для всех форматов ultralytics использует одинаковые
+# пред- и постобработку и трекер.
+PYTORCH_EXTENSIONS = (".pt", ".pth")
+ONNX_EXTENSION = ".onnx"
+OPENVINO_SUFFIX = "_openvino_model"
+
+
+def model_backend(path):
+    if path.rstrip("/\\").endswith(OPENVINO_SUFFIX):
+        return "openvino"
+    if path.endswith(ONNX_EXTENSION):
+        return "onnx"
+    return "pytorch"
+
+
+def list_models(models_dir="neural_network_models"):
+    # Имена моделей всех поддерживаемых форматов в папке моделей
+    if not os.path.isdir(models_dir):
+        return []
+    names = []
+    for name in sorted(os.listdir(models_dir)):
+        path = os.path.join(models_dir, name)
+        if os.path.isdir(path):
+            if name.endswith(OPENVINO_SUFFIX):
+                names.append(name)
+        elif name.endswith(PYTORCH_EXTENSIONS + (ONNX_EXTENSION,)):
+            names.append(name)
+    return names
+
+
+def load_yolo(path):
+    from ultralytics import YOLO
+    if model_backend(path) == "pytorch":
+        return YOLO(path)
+    # У экспортированной модели задача не сохраняется, указываем явно
+    return YOLO(path, task="detect")
+
+
+def path_size(path):
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return os.path.getsize(path)
+
+
+def model_size_bytes(model, path):
+    # Размер весов в памяти, если модель PyTorch, иначе размер файлов модели
+    if model_backend(path) == "pytorch":
+        try:
+            return sum(p.numel() * p.element_size() for p in model.model.parameters())
+        except Exception:
+            pass
+    return path_size(path)
+
+
+def warm_up(model, size=640):
+    # Первый вызов модели выделяет память и инициализирует слои,
+    # поэтому он выполняется заранее на пустом кадре
+    dummy = np.zeros((size, size, 3), dtype=np.uint8)
+    model.predict(dummy, verbose=False)
+
+
+def reset_trackers(model):
+    # Сброс состояния трекеров модели, взятой из кэша
+    predictor = getattr(model, "predictor", None)
+    for tracker in getattr(predictor, "trackers", None) or []:
+        tracker.reset()
+
+
+class ModelRegistry:
+    """Кэш загруженных моделей.
+
+    Ключ - путь и время изменения файла, так что обновленный файл модели
+    загружается заново. Модели вытесняются по LRU, когда суммарный размер
+    превышает memory_budget_mb. Загрузка с прогревом может выполняться в
+    фоне (preload), get дожидается ее результата. Фоновые загрузки
+    выполняются по одной в потоке-демоне: закрытие приложения во время
+    загрузки не ждет ее окончания.
+    """
+
+    def __init__(self, memory_budget_mb=1024, loader=load_yolo, warm_up_size=640):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.loader = loader
+        self.warm_up_size = warm_up_size
+        self.lock = threading.RLock()
+        self.models = OrderedDict()  # (path, mtime) -> (model, size)
+        self.pending = {}  # (path, mtime) -> Future
+        self.requests = queue.Queue()  # (key, Future) или None для остановки
+        self.hits = 0
+        self.misses = 0
+        self.thread = threading.Thread(target=self._run, name="ModelRegistry", daemon=True)
+        self.thread.start()
+
+    def _key(self, path):
+        return os.path.abspath(path), os.path.getmtime(path)
+
+    def _run(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                break
+            key, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._load(key))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _load(self, key):
+        path = key[0]
+        model = self.loader(path)
+        if self.warm_up_size:
+            warm_up(model, self.warm_up_size)
+        size = model_size_bytes(model, path)
+        with self.lock:
+            # Устаревшие версии того же файла больше не нужны
+            for old_key in [k for k in self.models if k[0] == path and k != key]:
+                del self.models[old_key]
+            self.models[key] = (model, size)
+            self.models.move_to_end(key)
+            self._evict(keep=key)
+            self.pending.pop(key, None)
+        return model
+
+    def _evict(self, keep):
+        total = sum(size for _, size in self.models.values())
+        for key in list(self.models):
+            if total <= self.memory_budget:
+                break
+            if key == keep:
+                continue
+            _, size = self.models.pop(key)
+            total -= size
+
+    def preload(self, path):
+        # Фоновая загрузка и прогрев; возвращает Future с моделью
+        key = self._key(path)
+        with self.lock:
+            if key in self.models:
+                future = Future()
+                future.set_result(self.models[key][0])
+                return future
+            if key not in self.pending:
+                future = Future()
+                self.pending[key] = future
+                self.requests.put((key, future))
+                future.add_done_callback(lambda f, key=key: self._forget_failed(key, f))
+            return self.pending[key]
+
+    def _forget_failed(self, key, future):
+        if future.cancelled() or future.exception() is not None:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def get(self, path):
+        key = self._key(path)
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                self.hits += 1
+                return self.models[key][0]
+            self.misses += 1
+        return self.preload(path).result()
+
+    def get_async(self, path):
+        # Как get, но без ожидания: Future с моделью (уже готовой, если она в кэше)
+        key = self._key(path)
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                self.hits += 1
+                future = Future()
+                future.set_result(self.models[key][0])
+                return future
+            self.misses += 1
+        return self.preload(path)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "models": len(self.models),
+                "memory_mb": round(sum(size for _, size in self.models.values()) / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def shutdown(self):
+        # Ожидающие загрузки отменяются, текущая дорабатывает в потоке-демоне
+        with self.lock:
+            pending = list(self.pending.values())
+        for future in pending:
+            future.cancel()
+        self.requests.put(None)
@@ -0,0 +1,214 @@
+import argparse
+import os
+import time
+import cv2
+import torch
+from ultralytics import YOLO
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+from detection_saver import DetectionWriter
+from frame_grabber import FrameGrabber
+from location_service import LocationService, create_location_source
+from spatial_dedup import SpatialDedup
+from track_store import TrackStore
+from overlay_renderer import OverlayRenderer
+
+
+def create_tracker(frame_rate=30, config="bytetrack.yaml"):
+    # Отдельный ByteTrack с настройками ultralytics по умолчанию
+    args = IterableSimpleNamespace(**yaml_load(check_yaml(config)))
+    return BYTETracker(args=args, frame_rate=frame_rate)
+
+
+def apply_tracker(tracker, result):
+    # Как в ultralytics (on_predict_postprocess_end): рамки результата
+    # заменяются подтвержденными треками с идентификаторами
+    det = result.boxes.cpu().numpy()
+    if len(det) == 0:
+        return result
+    tracks = tracker.update(det, result.orig_img)
+    if len(tracks) == 0:
+        return result
+    result = result[tracks[:, -1].astype(int)]
+    result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+    return result
+
+
+class SourceState:
+    """Состояние трекинга одного источника (камеры или видеофайла)."""
+
+    def __init__(self, source):
+        self.source = source
+        self.grabber = FrameGrabber(source)
+        fps = self.grabber.get(cv2.CAP_PROP_FPS)
+        self.tracker = create_tracker(int(round(fps)) if fps and fps > 0 else 30)
+        # Трек удаляется из истории, когда ByteTrack уже забыл его (с запасом)
+        self.track_history = TrackStore(max_points=30, ttl_frames=2 * self.tracker.max_time_lost)
+        self.saved_track_ids = set()
+        self.last_frame_id = None
+        self.frames = 0
+
+    @property
+    def name(self):
+        if isinstance(self.source, str):
+            return os.path.splitext(os.path.basename(self.source))[0]
+        return f"cam{self.source}"
+
+
+class MultiCameraTracker:
+    """Трекинг по нескольким источникам одним пакетным вызовом YOLO за такт.
+
+    Детекция выполняется пакетно (model.predict), а трекинг - отдельным
+    ByteTrack каждого источника по его результату, поэтому идентификаторы
+    разных камер не смешиваются и сохраняются, даже если источник
+    пропускает такт или другой источник закончился.
+    """
+
+    def __init__(self, model, sources, output_dir="result_images", sink="json", location=None, dedup=None):
+        self.model = model
+        self.output_dir = output_dir
+        # С координатами один дефект, увиденный несколькими камерами, сохраняется один раз
+        self.writer = DetectionWriter(output_dir, sink=sink, location=location, dedup=dedup)
+        self.renderer = OverlayRenderer(model.names)
+        self.states = [SourceState(source) for source in sources]
+        self.active = [state for state in self.states if state.grabber.isOpened()]
+        self.batches = 0
+        self.frames = 0
+        self.start_time = None
+
+    def collect_batch(self, timeout=1.0):
+        # Пары (state, frame) с новым кадром от активных источников. Источник
+        # без нового кадра пропускает такт (уже обработанный кадр повторно
+        # не подается), закончившийся источник исключается.
+        batch = []
+        alive = []
+        for state in self.active:
+            frame_id, frame = state.grabber.read_latest(timeout=timeout)
+            if frame is None or frame_id == state.last_frame_id:
+                if state.grabber.isOpened():
+                    alive.append(state)
+                continue
+            state.last_frame_id = frame_id
+            batch.append((state, frame))
+            alive.append(state)
+        self.active = alive
+        return batch
+
+    def step(self):
+        # Один такт: сбор пакета, пакетная детекция, трекинг по источникам.
+        # Возвращает список (state, display_frame) или None, если источники закончились.
+        batch = []
+        while not batch:
+            if not self.active:
+                return None
+            batch = self.collect_batch()
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+
+        frames = [frame for _, frame in batch]
+        results = self.model.predict(frames, verbose=False)
+        self.batches += 1
+        self.frames += len(frames)
+
+        output = []
+        for (state, frame), result in zip(batch, results):
+            state.frames += 1
+            result = apply_tracker(state.tracker, result)
+            state.saved_track_ids.difference_update(state.track_history.evict())
+            output.append((state, self.process_result(state, frame, result)))
+        return output
+
+    def process_result(self, state, frame, result):
+        if result.boxes is None or result.boxes.id is None:
+            return self.renderer.render(frame, result)
+
+        boxes = result.boxes.xywh.cpu()
+        track_ids = result.boxes.id.int().cpu().tolist()
+        class_ids = result.boxes.cls.int().cpu().tolist()
+        for box, track_id, cls in zip(boxes, track_ids, class_ids):
+            x, y, w, h = box
+            state.track_history.add(track_id, float(x), float(y))
+
+            if track_id not in state.saved_track_ids:
+                label = self.model.names[cls]
+                base_filename = self.writer.submit(frame, (float(x), float(y), float(w), float(h)), label, track_id,
+                                                   extra={"Source": state.name})
+                state.saved_track_ids.add(track_id)
+                print(f"[{state.name}] Queued: {base_filename}")
+        return self.renderer.render(frame, result, state.track_history)
+
+    def throughput(self):
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0.0
+        fps = self.frames / elapsed if elapsed > 0 else 0.0
+        return {
+            "sources": len(self.states),
+            "batches": self.batches,
+            "frames": self.frames,
+            "elapsed_s": round(elapsed, 2),
+            "fps": round(fps, 1),
+            "per_source": {state.name: state.frames for state in self.states},
+        }
+
+    def release(self):
+        for state in self.states:
+            state.grabber.release()
+        self.writer.close()
+
+
+def parse_source(value):
+    # Номер камеры или путь к видеофайлу
+    return int(value) if value.isdigit() else value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный трекинг по нескольким камерам")
+    parser.add_argument("sources", nargs="+", help="номера камер и/или пути к видеофайлам")
+    parser.add_argument("--model", default="neural_network_models/yolov8n.pt")
+    parser.add_argument("--output-dir", default="result_images")
+    parser.add_argument("--sink", choices=["json", "jsonl", "sqlite"], default="json",
+                        help="формат журнала обнаружений")
+    parser.add_argument("--location", help='источник координат: "ip", "nmea:/dev/ttyUSB0" или "replay:points.csv"')
+    parser.add_argument("--dedup-radius", type=float, default=15.0,
+                        help="радиус повторов одного дефекта, м (0 - отключено; нужен --location с GPS, не ip)")
+    parser.add_argument("--no-display", action="store_true", help="не показывать окна")
+    args = parser.parse_args()
+
+    model = YOLO(args.model)
+    location_source = create_location_source(args.location)
+    location = LocationService(location_source) if location_source else None
+    dedup = None
+    if location and location.precise and args.dedup_radius:
+        dedup = SpatialDedup(os.path.join(args.output_dir, "spatial_index.sqlite"), args.dedup_radius)
+    tracker = MultiCameraTracker(model, [parse_source(s) for s in args.sources], args.output_dir, args.sink,
+                                 location, dedup)
+    if not tracker.active:
+        print("Нет доступных источников.")
+        tracker.release()
+        return
+
+    try:
+        while True:
+            output = tracker.step()
+            if output is None:
+                break
+            if not args.no_display:
+                for state, display_frame in output:
+                    cv2.imshow(f"YOLOv8 Tracking {state.name}", display_frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tracker.release()
+        if location:
+            location.close()
+        if dedup:
+            dedup.close()
+        cv2.destroyAllWindows()
+    print(f"Производительность: {tracker.throughput()}")
+
+
+if __name__ == "__main__":
+    main()
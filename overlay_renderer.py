@@ -0,0 +1,155 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+TRAIL_COLOR = (230, 230, 230)
+TRAIL_THICKNESS = 10
+
+# Палитра цветов классов (BGR)
+PALETTE = [
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+    (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0),
+    (168, 153, 44), (255, 194, 0), (147, 69, 52), (255, 115, 100), (236, 24, 0),
+    (255, 56, 132), (133, 0, 82), (255, 56, 203), (200, 149, 255), (199, 55, 255),
+]
+
+
+class OverlayRenderer:
+    """Отрисовка рамок, подписей и следов треков за один проход по кадру.
+
+    Точки следов всех треков копируются в один заранее выделенный массив,
+    а все следы рисуются одним вызовом cv2.polylines. Кадр копируется один
+    раз вместо results[0].plot() плюс отдельной отрисовки каждого следа.
+    """
+
+    def __init__(self, names, max_tracks=256, max_points=30, line_width=2, font_scale=0.5):
+        self.names = names
+        self.max_points = max_points
+        self.line_width = line_width
+        self.font_scale = font_scale
+        self.trails = np.zeros((max_tracks, max_points, 2), dtype=np.int32)
+        self.render_time = 0.0  # сглаженное время отрисовки, с
+        self.frames = 0
+
+    def _ensure_capacity(self, tracks):
+        if tracks > len(self.trails):
+            self.trails = np.zeros((max(tracks, 2 * len(self.trails)), self.max_points, 2), dtype=np.int32)
+
+    def render(self, frame, result=None, track_history=None, track_ids=None, copy=True, boxes_xywh=None):
+        # result - результат model.track для кадра (или None на кадрах без
+        # нейросети); track_ids - треки, чьи следы рисовать (по умолчанию
+        # треки из result); boxes_xywh - рамки [(x, y, w, h, cls, conf, track_id)]
+        # для кадров без нейросети (например, предсказанные MotionPredictor)
+        start = time.perf_counter()
+        canvas = frame.copy() if copy else frame
+
+        boxes = result.boxes if result is not None else None
+        if boxes is not None and len(boxes):
+            xyxy = boxes.xyxy.cpu().numpy().astype(np.int32)
+            classes = boxes.cls.int().cpu().tolist()
+            confidences = boxes.conf.cpu().tolist()
+            ids = boxes.id.int().cpu().tolist() if boxes.id is not None else [None] * len(classes)
+            for (x1, y1, x2, y2), cls, conf, track_id in zip(xyxy, classes, confidences, ids):
+                self.draw_box(canvas, x1, y1, x2, y2, cls, conf, track_id)
+            if track_ids is None:
+                track_ids = [track_id for track_id in ids if track_id is not None]
+        for x, y, w, h, cls, conf, track_id in boxes_xywh or []:
+            self.draw_box(canvas, x - w / 2, y - h / 2, x + w / 2, y + h / 2, cls, conf, track_id)
+
+        if track_history is not None and track_ids:
+            self.draw_trails(canvas, track_history, track_ids)
+
+        elapsed = time.perf_counter() - start
+        self.render_time = elapsed if self.frames == 0 else 0.9 * self.render_time + 0.1 * elapsed
+        self.frames += 1
+        return canvas
+
+    def draw_box(self, canvas, x1, y1, x2, y2, cls, conf, track_id=None):
+        color = PALETTE[cls % len(PALETTE)]
+        cv2.rectangle(canvas, (int(x1), int(y1)), (int(x2), int(y2)), color, self.line_width)
+        label = f"{self.names[cls]} {conf:.2f}" if track_id is None else \
+            f"id:{track_id} {self.names[cls]} {conf:.2f}"
+        cv2.putText(canvas, label, (int(x1), max(int(y1) - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX,
+                    self.font_scale, color, self.line_width)
+
+    def draw_trails(self, canvas, track_history, track_ids):
+        self._ensure_capacity(len(track_ids))
+        polylines = []
+        for i, track_id in enumerate(track_ids):
+            if track_id not in track_history:
+                continue
+            points = track_history.points(track_id)
+            count = len(points)
+            if count == 0:
+                continue
+            self.trails[i, :count] = points
+            polylines.append(self.trails[i, :count].reshape((-1, 1, 2)))
+        if polylines:
+            cv2.polylines(canvas, polylines, isClosed=False, color=TRAIL_COLOR, thickness=TRAIL_THICKNESS)
+
+    def stats(self):
+        return {"render_ms": round(self.render_time * 1000, 2), "frames": self.frames}
+
+
+def legacy_overlay(result, track_history, track_ids):
+    # Прежний способ: results[0].plot() и отдельный polylines на каждый трек
+    display_frame = result.plot()
+    for track_id in track_ids:
+        points = np.hstack(track_history.points(track_id)).astype(np.int32).reshape((-1, 1, 2))
+        cv2.polylines(display_frame, [points], isClosed=False, color=TRAIL_COLOR, thickness=TRAIL_THICKNESS)
+    return display_frame
+
+
+def compare_overlay_cost(video_path, model_path, frames=200):
+    # Среднее время отрисовки кадра прежним способом и OverlayRenderer, мс
+    from ultralytics import YOLO
+    from track_store import TrackStore
+
+    model = YOLO(model_path)
+    renderer = OverlayRenderer(model.names)
+    track_history = TrackStore()
+    legacy_time = 0.0
+    renderer_time = 0.0
+    measured = 0
+    cap = cv2.VideoCapture(video_path)
+    while measured < frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        result = model.track(frame, persist=True, verbose=False)[0]
+        if result.boxes is None or result.boxes.id is None:
+            continue
+        track_ids = result.boxes.id.int().cpu().tolist()
+        for (x, y, _, _), track_id in zip(result.boxes.xywh.cpu().tolist(), track_ids):
+            track_history.add(track_id, x, y)
+
+        start = time.perf_counter()
+        legacy_overlay(result, track_history, track_ids)
+        legacy_time += time.perf_counter() - start
+        start = time.perf_counter()
+        renderer.render(frame, result, track_history)
+        renderer_time += time.perf_counter() - start
+        measured += 1
+    cap.release()
+    if not measured:
+        return None
+    return {
+        "frames": measured,
+        "legacy_ms": round(legacy_time / measured * 1000, 3),
+        "renderer_ms": round(renderer_time / measured * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение стоимости отрисовки кадра")
+    parser.add_argument("video", help="видеофайл для замера")
+    parser.add_argument("--model", default="neural_network_models/yolov8n.pt")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+    print(compare_overlay_cost(args.video, args.model, args.frames))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Этапы конвейера в порядке прохождения кадра
+STAGES = ["capture", "roi", "preprocess", "inference", "postprocess", "tracking", "draw", "display", "encode", "write"]
+QUANTILES = (50, 95, 99)
+
+
+class PipelineMetrics:
+    """Замеры времени этапов конвейера, частоты кадров и состояния очередей.
+
+    Для каждого этапа хранятся последние window длительностей, по ним
+    считаются p50/p95/p99; общее число и сумма замеров накапливаются
+    за все время. tick отмечает события (кадры) для подсчета частоты за
+    последние rate_window секунд. gauge регистрирует функцию, значение
+    которой (глубина очереди, число отброшенных кадров) читается при
+    снимке. Методы потокобезопасны и вызываются из любых потоков.
+    """
+
+    def __init__(self, window=1000, rate_window=5.0):
+        self.window = window
+        self.rate_window = rate_window
+        self.lock = threading.Lock()
+        self.samples = {}  # этап -> deque длительностей, с
+        self.totals = {}  # этап -> [число, сумма]
+        self.ticks = {}  # имя -> deque времен событий
+        self.gauges = {}  # имя -> функция без аргументов
+
+    def record(self, stage, seconds):
+        with self.lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+                self.totals[stage] = [0, 0.0]
+            self.samples[stage].append(seconds)
+            total = self.totals[stage]
+            total[0] += 1
+            total[1] += seconds
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def tick(self, name, now=None):
+        now = time.perf_counter() if now is None else now
+        with self.lock:
+            events = self.ticks.setdefault(name, deque())
+            events.append(now)
+            while events and events[0] < now - self.rate_window:
+                events.popleft()
+
+    def gauge(self, name, fn):
+        with self.lock:
+            self.gauges[name] = fn
+
+    def snapshot(self):
+        now = time.perf_counter()
+        with self.lock:
+            samples = {stage: np.array(values) for stage, values in self.samples.items()}
+            totals = {stage: tuple(total) for stage, total in self.totals.items()}
+            ticks = {name: [t for t in events if t >= now - self.rate_window] for name, events in self.ticks.items()}
+            gauges = dict(self.gauges)
+
+        stages = {}
+        for stage in sorted(samples, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            values = samples[stage]
+            if not len(values):
+                continue
+            percentiles = np.percentile(values, QUANTILES) * 1000
+            stages[stage] = {f"p{q}_ms": round(float(p), 2) for q, p in zip(QUANTILES, percentiles)}
+            stages[stage]["count"] = totals[stage][0]
+            stages[stage]["sum_s"] = round(totals[stage][1], 3)
+
+        fps = {}
+        for name, events in ticks.items():
+            span = events[-1] - events[0] if len(events) > 1 else 0.0
+            fps[name] = round((len(events) - 1) / span, 1) if span > 0 else 0.0
+
+        values = {}
+        for name, fn in gauges.items():
+            try:
+                values[name] = fn()
+            except Exception:
+                values[name] = None
+        return {"stages": stages, "fps": fps, "gauges": values}
+
+    def summary(self):
+        # Короткая строка для информационной панели
+        snapshot = self.snapshot()
+        parts = [f"{name} {value:.1f} fps" for name, value in snapshot["fps"].items()]
+        parts += [f"{stage} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}/{s['p99_ms']:.1f} мс"
+                  for stage, s in snapshot["stages"].items()]
+        parts += [f"{name} {value}" for name, value in snapshot["gauges"].items()]
+        return " | ".join(parts)
+
+    def prometheus(self, prefix="pipeline"):
+        # Текстовый формат Prometheus
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {prefix}_stage_seconds summary"]
+        for stage, s in snapshot["stages"].items():
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{q / 100}"}} {s[f"p{q}_ms"] / 1000:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {s["sum_s"]}')
+        lines.append(f"# TYPE {prefix}_fps gauge")
+        for name, value in snapshot["fps"].items():
+            lines.append(f'{prefix}_fps{{name="{name}"}} {value}')
+        lines.append(f"# TYPE {prefix}_gauge gauge")
+        for name, value in snapshot["gauges"].items():
+            if isinstance(value, (int, float)):
+                lines.append(f'{prefix}_gauge{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsDumper:
+    """Периодическая запись метрик в файл (для работы без окон).
+
+    Формат выбирается по расширению: .prom - текст Prometheus (например,
+    для node_exporter textfile collector), иначе JSON. Файл заменяется
+    целиком, чтобы читатель не увидел его недописанным.
+    """
+
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="MetricsDumper", daemon=True)
+        self.thread.start()
+
+    def dump(self):
+        if self.path.endswith(".prom"):
+            text = self.metrics.prometheus()
+        else:
+            text = json.dumps(dict(self.metrics.snapshot(), time=time.time()), ensure_ascii=False, indent=2,
+                              default=str)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.dump()
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.dump()
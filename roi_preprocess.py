@@ -0,0 +1,162 @@
+import time
+
+import cv2
+import numpy as np
+
+# Наибольший шаг сетки YOLOv8: размер входа модели должен быть ему кратен
+MODEL_STRIDE = 32
+
+
+def check_roi(roi):
+    # Доли кадра должны задавать непустой прямоугольник внутри кадра,
+    # иначе срез numpy не совпадет с crop_size и рамки пересчитаются неверно
+    if roi is None:
+        return None
+    if len(roi) != 4:
+        raise ValueError(f"ROI задается четырьмя числами x1,y1,x2,y2: {roi}")
+    x1, y1, x2, y2 = (float(v) for v in roi)
+    if not (0.0 <= x1 < x2 <= 1.0 and 0.0 <= y1 < y2 <= 1.0):
+        raise ValueError(f"ROI должен удовлетворять 0 <= x1 < x2 <= 1 и 0 <= y1 < y2 <= 1: {roi}")
+    return x1, y1, x2, y2
+
+
+def parse_roi(text):
+    # "x1,y1,x2,y2" в долях кадра, например "0,0.4,1,1" - нижние 60% кадра
+    if not text:
+        return None
+    return check_roi([float(v) for v in text.split(",")])
+
+
+def parse_mask(text):
+    # "x,y;x,y;x,y;..." - многоугольник в долях всего кадра, например
+    # "0,1;0.4,0.4;0.6,0.4;1,1" - трапеция дороги
+    if not text:
+        return None
+    points = []
+    for pair in text.split(";"):
+        values = [float(v) for v in pair.split(",")]
+        if len(values) != 2 or not all(0.0 <= v <= 1.0 for v in values):
+            raise ValueError(f"Точка маски задается двумя числами x,y от 0 до 1: {pair}")
+        points.append(tuple(values))
+    if len(points) < 3:
+        raise ValueError(f"Маска задается хотя бы тремя точками: {text}")
+    return points
+
+
+class RoiPreprocessor:
+    """Подготовка кадра для нейросети: вырезание области, маска и уменьшение.
+
+    roi - прямоугольник (x1, y1, x2, y2) в долях кадра, например нижняя
+    часть кадра с дорожным покрытием; вырезание не копирует кадр. mask -
+    многоугольник [(x, y), ...] в долях всего кадра: точки вне него
+    закрашиваются черным. max_side - наибольшая сторона изображения,
+    подаваемого в модель; тогда и размер входа модели (imgsz) задается по
+    этому изображению, округленным до MODEL_STRIDE, иначе letterbox
+    ultralytics снова увеличил бы его до 640 и уменьшение ничего бы не
+    сэкономило. restore переводит рамки результата обратно в
+    координаты полного кадра и подставляет полный кадр в orig_img, так что
+    снимки, линии треков и отрисовка работают с исходным разрешением.
+    track - единственный путь вызова модели с подготовкой кадра.
+    """
+
+    def __init__(self, roi=None, max_side=None, mask=None, interpolation=cv2.INTER_AREA):
+        self.roi = check_roi(roi)
+        self.max_side = max_side
+        self.mask_polygon = mask
+        self.interpolation = interpolation
+        self.frame_shape = None
+        self.offset = (0, 0)
+        self.crop_size = None  # (ширина, высота) вырезанной области
+        self.size = None  # (ширина, высота) изображения для модели
+        self.imgsz = None  # размер входа модели при заданном max_side
+        self.mask = None
+        self.frames = 0
+        self.pixels_in = 0
+        self.pixels_out = 0
+        self.latency = 0.0  # время последнего model.track без подготовки кадра, с
+
+    @property
+    def active(self):
+        return bool(self.roi or self.max_side or self.mask_polygon)
+
+    def _configure(self, shape):
+        # Геометрия пересчитывается только при смене размера кадра
+        height, width = shape[:2]
+        x1, y1, x2, y2 = self.roi or (0.0, 0.0, 1.0, 1.0)
+        left, top = min(int(round(x1 * width)), width - 1), min(int(round(y1 * height)), height - 1)
+        right = min(max(int(round(x2 * width)), left + 1), width)
+        bottom = min(max(int(round(y2 * height)), top + 1), height)
+        self.frame_shape = shape[:2]
+        self.offset = (left, top)
+        self.crop_size = (right - left, bottom - top)
+        scale = 1.0
+        if self.max_side and max(self.crop_size) > self.max_side:
+            scale = self.max_side / max(self.crop_size)
+        self.size = (max(1, int(round(self.crop_size[0] * scale))), max(1, int(round(self.crop_size[1] * scale))))
+        self.imgsz = None
+        if self.max_side:
+            self.imgsz = -(-max(self.size) // MODEL_STRIDE) * MODEL_STRIDE
+        self.mask = None
+        if self.mask_polygon:
+            points = np.array([((x * width - left) * self.size[0] / self.crop_size[0],
+                                (y * height - top) * self.size[1] / self.crop_size[1])
+                               for x, y in self.mask_polygon], dtype=np.int32)
+            self.mask = np.zeros((self.size[1], self.size[0]), dtype=np.uint8)
+            cv2.fillPoly(self.mask, [points], 255)
+
+    def prepare(self, frame):
+        # Изображение для model.track; исходный кадр не изменяется
+        if frame.shape[:2] != self.frame_shape:
+            self._configure(frame.shape)
+        left, top = self.offset
+        image = frame[top:top + self.crop_size[1], left:left + self.crop_size[0]]
+        if self.size != self.crop_size:
+            image = cv2.resize(image, self.size, interpolation=self.interpolation)
+        if self.mask is not None:
+            image = cv2.bitwise_and(image, image, mask=self.mask)
+        self.frames += 1
+        self.pixels_in += frame.shape[0] * frame.shape[1]
+        self.pixels_out += self.size[0] * self.size[1]
+        return image
+
+    def restore(self, results, frame):
+        # Рамки (x1, y1, x2, y2, [id], conf, cls) переводятся в координаты полного кадра
+        scale_x = self.crop_size[0] / self.size[0]
+        scale_y = self.crop_size[1] / self.size[1]
+        left, top = self.offset
+        for result in results:
+            result.orig_img = frame
+            result.orig_shape = frame.shape[:2]
+            if result.boxes is None:
+                continue
+            data = result.boxes.data.clone()
+            data[:, [0, 2]] = data[:, [0, 2]] * scale_x + left
+            data[:, [1, 3]] = data[:, [1, 3]] * scale_y + top
+            result.update(boxes=data)
+        return results
+
+    def track(self, model, frame, metrics=None, **kwargs):
+        # model.track на подготовленном изображении с рамками в координатах кадра.
+        # Время самого model.track сохраняется в latency; с metrics время
+        # подготовки кадра и перевода рамок записывается как этап "roi"
+        start = time.perf_counter()
+        image = self.prepare(frame) if self.active else frame
+        if self.imgsz:
+            kwargs.setdefault("imgsz", self.imgsz)
+        track_start = time.perf_counter()
+        results = model.track(image, **kwargs)
+        track_end = time.perf_counter()
+        self.latency = track_end - track_start
+        if self.active:
+            self.restore(results, frame)
+            if metrics:
+                metrics.record("roi", track_start - start + time.perf_counter() - track_end)
+        return results
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "input_size": self.size,
+            "imgsz": self.imgsz,
+            "pixel_ratio": round(self.pixels_out / self.pixels_in, 3) if self.pixels_in else None,
+        }
@@ -0,0 +1,143 @@
+import argparse
+import math
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from detection_index import distance_m
+
+METERS_PER_DEGREE = 111320.0
+
+
+def grid_cell(lat, lon, cell_m):
+    # Ячейка сетки со стороной cell_m метров (равнопромежуточная проекция)
+    y = lat * METERS_PER_DEGREE
+    x = lon * METERS_PER_DEGREE * math.cos(math.radians(lat))
+    return int(math.floor(x / cell_m)), int(math.floor(y / cell_m))
+
+
+class SpatialDedup:
+    """Постоянный индекс уже сохраненных дефектов по месту.
+
+    Обнаружение ищется среди дефектов того же класса в своей и соседних
+    ячейках сетки со стороной radius_m. Если ближе radius_m уже есть
+    дефект, у него увеличивается счетчик и обновляется last_seen, а новое
+    обнаружение считается повтором. Индекс хранится в SQLite (WAL), так
+    что повторы отсекаются между проездами, перезапусками, камерами и
+    процессами пакетной обработки; поиск и вставка выполняются в одной
+    транзакции BEGIN IMMEDIATE. Если файлы нового дефекта записать не
+    удалось, forget удаляет его из индекса, чтобы следующие обнаружения
+    на этом месте не отбрасывались как повторы несуществующего снимка.
+    Нужны точные координаты (GPS): с приблизительными (по IP) все
+    обнаружения класса оказались бы повторами первого.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS defects (
+            id INTEGER PRIMARY KEY,
+            class_name TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            cell_x INTEGER NOT NULL,
+            cell_y INTEGER NOT NULL,
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1,
+            image_name TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_defects_cell ON defects (class_name, cell_x, cell_y);
+    """
+
+    def __init__(self, path="result_images/spatial_index.sqlite", radius_m=15.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.radius_m = radius_m
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.new = 0
+        self.duplicates = 0
+
+    def _nearest(self, label, lat, lon, cell_x, cell_y):
+        rows = self.conn.execute(
+            "SELECT id, latitude, longitude FROM defects WHERE class_name = ? "
+            "AND cell_x BETWEEN ? AND ? AND cell_y BETWEEN ? AND ?",
+            (label, cell_x - 1, cell_x + 1, cell_y - 1, cell_y + 1)).fetchall()
+        best = None
+        for defect_id, defect_lat, defect_lon in rows:
+            distance = distance_m(lat, lon, defect_lat, defect_lon)
+            if distance <= self.radius_m and (best is None or distance < best[1]):
+                best = (defect_id, distance)
+        return best
+
+    def register(self, label, lat, lon, detected_at=None, image_name=None):
+        # id нового дефекта (его нужно сохранить) или None для повтора уже известного
+        seen = (detected_at or datetime.now()).isoformat(timespec="seconds")
+        cell_x, cell_y = grid_cell(lat, lon, self.radius_m)
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                nearest = self._nearest(label, lat, lon, cell_x, cell_y)
+                if nearest is not None:
+                    self.conn.execute(
+                        "UPDATE defects SET count = count + 1, last_seen = max(last_seen, ?) WHERE id = ?",
+                        (seen, nearest[0]))
+                else:
+                    cursor = self.conn.execute(
+                        "INSERT INTO defects (class_name, latitude, longitude, cell_x, cell_y, first_seen, "
+                        "last_seen, image_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (label, lat, lon, cell_x, cell_y, seen, seen, image_name))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            if nearest is not None:
+                self.duplicates += 1
+                return None
+            self.new += 1
+            return cursor.lastrowid
+
+    def forget(self, defect_id):
+        # Отмена register для дефекта, файлы которого не были записаны
+        with self.lock:
+            self.conn.execute("DELETE FROM defects WHERE id = ?", (defect_id,))
+            self.new -= 1
+
+    def stats(self):
+        with self.lock:
+            return {"new": self.new, "duplicates": self.duplicates}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Дефекты из индекса повторов, по числу обнаружений")
+    parser.add_argument("--index", default="result_images/spatial_index.sqlite")
+    parser.add_argument("--class", dest="class_name")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.index)
+    query = "SELECT class_name, latitude, longitude, count, first_seen, last_seen, image_name FROM defects"
+    params = []
+    if args.class_name:
+        query += " WHERE class_name = ?"
+        params.append(args.class_name)
+    query += " ORDER BY count DESC LIMIT ?"
+    params.append(args.limit)
+    for row in conn.execute(query, params):
+        print(row)
+    total, detections = conn.execute("SELECT count(*), coalesce(sum(count), 0) FROM defects").fetchone()
+    print(f"Дефектов: {total}, обнаружений: {detections}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import importlib
+import json
+import os
+import threading
+import time
+
+# Тяжелые модули, нужные только для нейросети (ultralytics тянет за собой torch)
+HEAVY_MODULES = ["ultralytics"]
+
+
+class StartupProfile:
+    """Замеры времени запуска приложения.
+
+    Отсчет идет от создания объекта, поэтому его нужно создавать до
+    остальных импортов. Учитывается время импорта отдельных модулей
+    (import_modules), время этапов от запуска (mark, например появление
+    окна и первый кадр) и время фоновой загрузки тяжелых модулей (preload).
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.imports = {}  # модуль -> время импорта, с
+        self.background = {}  # модуль -> время фонового импорта, с
+        self.marks = {}  # этап -> время от запуска, с
+        self.errors = {}
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def import_modules(self, *names):
+        # Импорт по очереди с замером; повторный import модуля потом бесплатен
+        for name in names:
+            t0 = time.perf_counter()
+            importlib.import_module(name)
+            self.imports[name] = round(time.perf_counter() - t0, 3)
+
+    def mark(self, name):
+        # Записывается только первое наступление этапа
+        with self.lock:
+            if name not in self.marks:
+                self.marks[name] = round(self.elapsed(), 3)
+
+    def preload(self, names=HEAVY_MODULES):
+        # Импорт в фоновом потоке, чтобы нажатие "Применить" не ждало загрузки torch
+        def run():
+            for name in names:
+                t0 = time.perf_counter()
+                try:
+                    importlib.import_module(name)
+                except Exception as e:
+                    with self.lock:
+                        self.errors[name] = str(e)
+                    continue
+                with self.lock:
+                    self.background[name] = round(time.perf_counter() - t0, 3)
+            self.mark("preloaded")
+
+        thread = threading.Thread(target=run, name="StartupPreload", daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        with self.lock:
+            return {
+                "imports": dict(self.imports),
+                "background_imports": dict(self.background),
+                "marks": dict(self.marks),
+                "errors": dict(self.errors),
+            }
+
+    def summary(self):
+        report = self.report()
+        parts = [f"{name} {seconds:.2f} с" for name, seconds in report["marks"].items()]
+        parts += [f"import {name} {seconds:.2f} с" for name, seconds in report["imports"].items()]
+        return "Запуск: " + ", ".join(parts)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=4)
+
+
+def preload_modules(names=HEAVY_MODULES):
+    # Фоновый импорт без замеров (для старых версий приложения)
+    return StartupProfile().preload(names)
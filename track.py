@@ -1,7 +1,6 @@
-from collections import defaultdict
 import cv2
-import numpy as np
 from ultralytics import YOLO
+from track_store import TRACK_BUFFER, TrackStore
 
 # Загрузка предварительно обученной модели YOLOv8
 model = YOLO('neural_network_models/yolov8n.pt')
@@ -9,8 +8,10 @@ model = YOLO('neural_network_models/yolov8n.pt')
 # Открытие видео файла
 cap = cv2.VideoCapture(0)
 
-# Создание словаря для хранения истории треков объектов
-track_history = defaultdict(lambda: [])
+# Создание хранилища истории треков объектов
+# (кольцевые буферы по 30 точек; трек удаляется, когда трекер уже не может
+# вернуть его id - срок считается в кадрах трекера, с запасом)
+track_history = TrackStore(max_points=30, ttl_frames=2 * TRACK_BUFFER)
 
 # Цикл для обработки каждого кадра видео
 while cap.isOpened():
@@ -34,13 +35,10 @@ while cap.isOpened():
         # Отрисовка треков
         for box, track_id in zip(boxes, track_ids):
             x, y, w, h = box  # координаты центра и размеры бокса
-            track = track_history[track_id]
-            track.append((float(x), float(y)))  # добавление координат центра объекта в историю
-            if len(track) > 30:  # ограничение длины истории до 30 кадров
-                track.pop(0)
+            track_history.add(track_id, float(x), float(y))  # добавление координат центра объекта в историю
 
             # Рисование линий трека
-            points = np.hstack(track).astype(np.int32).reshape((-1, 1, 2))
+            points = track_history.polyline(track_id)
             cv2.polylines(annotated_frame, [points], isClosed=False, color=(230, 230, 230), thickness=10)
 
         # Отображение аннотированного кадра
@@ -49,6 +47,9 @@ while cap.isOpened():
     # Если объекты не обнаружены, просто отображаем кадр
         cv2.imshow("YOLOv8 Tracking", frame)
      
+    # Удаление давно исчезнувших треков
+    track_history.evict()
+
     # Прерывание цикла при нажатии клавиши 'Esc'
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
@@ -1,11 +1,16 @@
-from collections import defaultdict
 import cv2
-import numpy as np
 from ultralytics import YOLO
 import os
+from detection_saver import DetectionWriter
+from inference_scheduler import InferenceScheduler, MotionPredictor
+from track_store import TRACK_BUFFER, TrackStore
+from overlay_renderer import OverlayRenderer
+from event_clip import EventClipBuffer
+from best_frame import BestFrameSelector
+from roi_preprocess import RoiPreprocessor
 from datetime import datetime
-import uuid
-import json
+from functools import partial
+import time
 
 # Загрузка предварительно обученной модели YOLOv8
 model = YOLO('neural_network_models/yolov8n.pt')
@@ -13,13 +18,71 @@ model = YOLO('neural_network_models/yolov8n.pt')
 # Открытие видео файла
 cap = cv2.VideoCapture(0)
 
-# Создание словаря для хранения истории треков объектов
-track_history = defaultdict(lambda: [])
+# Создание хранилища истории треков объектов
+# (кольцевые буферы по 30 точек; трек удаляется, когда трекер уже не может
+# вернуть его id - срок считается в кадрах трекера, с запасом)
+track_history = TrackStore(max_points=30, ttl_frames=2 * TRACK_BUFFER)
 saved_track_ids = set()  # Множество для хранения уже сохраненных track IDs
 
 # Создание директории для сохранения изображений, если она не существует
 output_dir = 'result_images'
 os.makedirs(output_dir, exist_ok=True)
+detection_sink = 'json'  # формат журнала обнаружений: 'json', 'jsonl' или 'sqlite'
+writer = DetectionWriter(output_dir, sink=detection_sink)
+
+# Область кадра для нейросети в долях кадра, например (0.0, 0.4, 1.0, 1.0) -
+# нижние 60% кадра с дорогой, и наибольшая сторона изображения для нейросети
+# (например, 640); рамки переводятся обратно в координаты полного кадра
+inference_roi = None  # None - весь кадр
+inference_max_side = None  # None - без уменьшения
+# Маска дороги в долях кадра, например [(0.0, 1.0), (0.4, 0.4), (0.6, 0.4), (1.0, 1.0)]
+inference_mask = None  # None - без маски
+preprocess = RoiPreprocessor(inference_roi, inference_max_side, inference_mask)
+
+# Клипы 5 с до и 5 с после появления объектов выбранных классов
+# (например, {'pothole'}); None - клипы не сохраняются
+event_clip_classes = None
+clips = None
+
+# Для каждого трека сохраняется лучший кадр (уверенность, размер, резкость,
+# удаленность от края), а не первое появление. Снимок записывается, когда
+# трек закончился или через commit_timeout секунд.
+commit_timeout = 10.0
+selector = BestFrameSelector(end_after=1.0, commit_timeout=commit_timeout)
+if event_clip_classes is not None:
+    clips = EventClipBuffer(output_dir, classes=event_clip_classes, max_delay=commit_timeout + 1.0)
+
+
+def commit_candidates(candidates):
+    for candidate in candidates:
+        base_filename = writer.submit(candidate.frame, candidate.box, candidate.label, candidate.track_id,
+                                      extra={"Confidence": round(candidate.confidence, 3)},
+                                      detected_at=datetime.fromtimestamp(candidate.timestamp),
+                                      on_saved=partial(on_saved, candidate))
+        saved_track_ids.add(candidate.track_id)  # Отмечаем, что изображение для этого track_id уже сохранено
+        print(f"Queued: {base_filename}")  # Debug statement
+
+
+def on_saved(candidate, base_filename):
+    # Вызывается потоком записи только для записанных файлов (не для повторов)
+    if clips and clips.wants(candidate.label):
+        clips.trigger(base_filename, candidate.timestamp)
+
+# Планировщик запуска нейросети: на медленных машинах модель запускается
+# не на каждом кадре, а треки на пропущенных кадрах продлеваются по скорости
+target_fps = 15.0  # желаемая частота обработки кадров
+max_latency = 0.5  # максимальный интервал между запусками нейросети, с
+scheduler = InferenceScheduler(target_fps=target_fps, max_latency=max_latency)
+predictor = MotionPredictor()
+
+
+def add_track_point(track_id, x, y):
+    track_history.add(track_id, float(x), float(y))  # добавление координат центра объекта в историю
+
+
+# Рамки, подписи и линии треков рисуются за один проход по кадру
+renderer = OverlayRenderer(model.names)
+
 
 # Цикл для обработки каждого кадра видео
 while cap.isOpened():
@@ -27,9 +90,33 @@ while cap.isOpened():
     success, frame = cap.read()
     if not success:
         break
+    # Время захвата: к нему привязываются клипы и время обнаружения,
+    # а не к моменту после работы нейросети
+    captured_at = time.time()
+
+    if clips:
+        clips.add(frame, captured_at)
+
+    if not scheduler.should_run():
+        # Кадр без нейросети: продление треков и рамок по предсказанной траектории
+        predicted = predictor.predict()
+        for track_id, x, y in predicted:
+            add_track_point(track_id, x, y)
+        display_frame = renderer.render(frame, None, track_history, [track_id for track_id, _, _ in predicted],
+                                        boxes_xywh=predictor.boxes(predicted))
+        cv2.imshow("YOLOv8 Tracking", display_frame)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+        continue
 
     # Применение YOLOv8 для отслеживания объектов на кадре, с сохранением треков между кадрами
-    results = model.track(frame, persist=True)
+    start = time.perf_counter()
+    results = preprocess.track(model, frame, persist=True)
+    scheduler.record(time.perf_counter() - start)
+
+    # Удаление давно исчезнувших треков вместе с отметками о сохранении
+    # (evict вызывается только на кадрах, которые прошли через трекер)
+    saved_track_ids.difference_update(track_history.evict())
 
     # Проверка на наличие объектов
     if results[0].boxes is not None and results[0].boxes.id is not None:
@@ -37,63 +124,33 @@ while cap.isOpened():
         boxes = results[0].boxes.xywh.cpu()  # xywh координаты боксов
         track_ids = results[0].boxes.id.int().cpu().tolist()  # идентификаторы треков
         class_ids = results[0].boxes.cls.int().cpu().tolist()  # идентификаторы классов
+        confidences = results[0].boxes.conf.cpu().tolist()  # уверенность
 
-        # Визуализация результатов на кадре для отображения
-        display_frame = results[0].plot()
-
-        # Отрисовка треков и сохранение изображения только для уникальных track_id
-        for box, track_id, cls in zip(boxes, track_ids, class_ids):
+        # Обновление треков и выбор лучшего кадра для еще не сохраненных track_id
+        predictor.retain(track_ids)
+        for box, track_id, cls, conf in zip(boxes, track_ids, class_ids, confidences):
             x, y, w, h = box  # координаты центра и размеры бокса
-            track = track_history[track_id]
-            track.append((float(x), float(y)))  # добавление координат центра объекта в историю
-            if len(track) > 30:  # ограничение длины истории до 30 кадров
-                track.pop(0)
-
-            # Рисование линий трека
-            points = np.hstack(track).astype(np.int32).reshape((-1, 1, 2))
-            cv2.polylines(display_frame, [points], isClosed=False, color=(230, 230, 230), thickness=10)
+            add_track_point(track_id, x, y)
+            predictor.observe(track_id, float(x), float(y), float(w), float(h), cls, conf)
 
-            # Рисование прямоугольника и метки только для уникального track_id
             if track_id not in saved_track_ids:
-                label = model.model.names[cls]  # Имя класса
-                annotated_frame = frame.copy()
-                cv2.rectangle(annotated_frame, (int(x - w / 2), int(y - h / 2)), (int(x + w / 2), int(y + h / 2)), (0, 255, 0), 2)
-                cv2.putText(annotated_frame, f'{label} ID:{track_id}', (int(x - w / 2), int(y - h / 2) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                # Сохранение изображения с уникальным track_id и GUID
-                timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f")
-                unique_id = uuid.uuid4()  # Генерация GUID
-                base_filename = f"{timestamp}_{label}_ID_{track_id}_{unique_id}"
-                image_filename = f"{output_dir}/{base_filename}.jpg"
-                cv2.imwrite(image_filename, annotated_frame)
-
-                # Создание JSON файла с метаданными
-                json_filename = f"{output_dir}/{base_filename}.json"
-                json_data = {
-                    "DateTimeDetection": timestamp,
-                    "ClassName": label,
-                    "Latitude": "N/A",
-                    "Longitude": "N/A",
-                    "SectionOfRoad": "Участок дороги",
-                    "CriticalLevel": 1,
-                    "RoadClass": "Автомагистраль",
-                    "RoadCategory": "IВ Общее число полос движения 4 и более",
-                    "Contractor": "Подрядная организация",
-                    "ImageName": os.path.basename(image_filename)
-                }
-                with open(json_filename, 'w', encoding='utf-8') as json_file:
-                    json.dump(json_data, json_file, indent=4, ensure_ascii=False)
-
-                saved_track_ids.add(track_id)  # Отмечаем, что изображение для этого track_id уже сохранено
-                print(f"Saved image: {image_filename}")  # Debug statement
-                print(f"Saved JSON: {json_filename}")  # Debug statement
+                label = model.names[cls]  # Имя класса
+                selector.observe(track_id, label, frame, (float(x), float(y), float(w), float(h)), conf,
+                                 now=captured_at)
+
+        # Визуализация результатов и линий треков на кадре для отображения
+        display_frame = renderer.render(frame, results[0], track_history)
 
         # Отображение аннотированного кадра
         cv2.imshow("YOLOv8 Tracking", display_frame)
     else:
+        predictor.retain([])
         # Если объекты не обнаружены, просто отображаем кадр
         cv2.imshow("YOLOv8 Tracking", frame)
 
+    # Сохранение снимка и JSON для закончившихся треков (в фоновом потоке)
+    commit_candidates(selector.poll(captured_at))
+
     # Прерывание цикла при нажатии клавиши 'Esc'
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
@@ -101,3 +158,13 @@ while cap.isOpened():
 # Освобождение видеозахвата и закрытие всех окон OpenCV
 cap.release()
 cv2.destroyAllWindows()
+
+# Сохранить лучшие кадры оставшихся треков и дождаться записи всех снимков
+commit_candidates(selector.flush())
+writer.close()
+if clips:
+    clips.close()
+print(f"Writer stats: {writer.stats()}")
+print(f"Scheduler stats: {scheduler.stats()}")
+print(f"Track store stats: {track_history.stats()}")
+print(f"Overlay stats: {renderer.stats()}")
@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+
+# track_buffer трекеров ultralytics по умолчанию (bytetrack.yaml, botsort.yaml):
+# столько кадров трекер помнит потерянный трек и может вернуть ему прежний id
+TRACK_BUFFER = 30
+
+
+class TrackStore:
+    """История треков в кольцевых буферах фиксированного размера.
+
+    Для каждого трека хранится массив NumPy на max_points точек, позиция
+    записи и время последнего появления. Добавление точки - O(1) без
+    выделения памяти. Треки, не появлявшиеся дольше ttl секунд, удаляются
+    методом evict. Если задан ttl_frames, срок считается в кадрах трекера:
+    evict вызывается один раз на каждый результат трекера, и трек удаляется,
+    когда не появлялся дольше ttl_frames таких кадров. Так удаленный трек
+    не может вернуться под тем же id при любой частоте кадров.
+    """
+
+    def __init__(self, max_points=30, ttl=5.0, evict_interval=1.0, ttl_frames=None):
+        self.max_points = max_points
+        self.ttl = ttl
+        self.ttl_frames = ttl_frames
+        self.evict_interval = evict_interval
+        self.frame = 0  # число кадров трекера (вызовов evict)
+        self.seen_frame = {}  # track_id -> кадр трекера последнего появления
+        self.buffers = {}  # track_id -> массив (max_points, 2) float32
+        self.counts = {}  # track_id -> число точек в буфере
+        self.heads = {}  # track_id -> индекс следующей записи
+        self.last_seen = {}  # track_id -> время последнего появления
+        self.last_evict = time.monotonic()
+        self.evicted_total = 0
+
+    def add(self, track_id, x, y, now=None):
+        buffer = self.buffers.get(track_id)
+        if buffer is None:
+            buffer = self.buffers[track_id] = np.empty((self.max_points, 2), dtype=np.float32)
+            self.counts[track_id] = 0
+            self.heads[track_id] = 0
+        head = self.heads[track_id]
+        buffer[head, 0] = x
+        buffer[head, 1] = y
+        self.heads[track_id] = (head + 1) % self.max_points
+        self.counts[track_id] = min(self.counts[track_id] + 1, self.max_points)
+        self.last_seen[track_id] = time.monotonic() if now is None else now
+        self.seen_frame[track_id] = self.frame
+
+    def points(self, track_id):
+        # Точки трека от старой к новой, массив (n, 2) float32
+        buffer = self.buffers.get(track_id)
+        if buffer is None:
+            return np.empty((0, 2), dtype=np.float32)
+        count = self.counts[track_id]
+        if count < self.max_points:
+            return buffer[:count]
+        head = self.heads[track_id]
+        return np.concatenate((buffer[head:], buffer[:head]))
+
+    def polyline(self, track_id):
+        # Точки в формате cv2.polylines
+        return self.points(track_id).astype(np.int32).reshape((-1, 1, 2))
+
+    def __contains__(self, track_id):
+        return track_id in self.buffers
+
+    def __len__(self):
+        return len(self.buffers)
+
+    def evict(self, now=None, force=False):
+        # Удаление треков, не появлявшихся дольше ttl (или ttl_frames кадров).
+        # Проверка выполняется не чаще evict_interval. Возвращает множество
+        # удаленных track_id.
+        self.frame += 1
+        now = time.monotonic() if now is None else now
+        if not force and now - self.last_evict < self.evict_interval:
+            return set()
+        self.last_evict = now
+        if self.ttl_frames is not None:
+            dead = {track_id for track_id, seen in self.seen_frame.items() if self.frame - seen > self.ttl_frames}
+        else:
+            dead = {track_id for track_id, seen in self.last_seen.items() if now - seen > self.ttl}
+        for track_id in dead:
+            del self.buffers[track_id]
+            del self.counts[track_id]
+            del self.heads[track_id]
+            del self.last_seen[track_id]
+            del self.seen_frame[track_id]
+        self.evicted_total += len(dead)
+        return dead
+
+    def clear(self):
+        self.buffers.clear()
+        self.counts.clear()
+        self.heads.clear()
+        self.last_seen.clear()
+        self.seen_frame.clear()
+
+    def stats(self):
+        return {
+            "tracks": len(self.buffers),
+            "points": sum(self.counts.values()),
+            "memory_kb": round(sum(buffer.nbytes for buffer in self.buffers.values()) / 1024, 1),
+            "evicted": self.evicted_total,
+        }
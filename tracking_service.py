@@ -0,0 +1,546 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+
+from best_frame import BestFrameSelector
+from detection_saver import DetectionWriter
+from frame_grabber import FrameGrabber
+from inference_worker import record_track_timing
+from location_service import LocationService, create_location_source
+from spatial_dedup import SpatialDedup
+from model_registry import ModelRegistry, list_models, reset_trackers
+from overlay_renderer import OverlayRenderer
+from pipeline_metrics import MetricsDumper, PipelineMetrics
+from roi_preprocess import RoiPreprocessor, parse_mask, parse_roi
+from track_store import TRACK_BUFFER, TrackStore
+
+INDEX_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Tracking service</title></head>
+<body>
+<img src="/stream.mjpg" style="max-width:100%">
+<pre id="events"></pre>
+<script>
+const events = new EventSource("/events");
+events.onmessage = (e) => {
+  const pre = document.getElementById("events");
+  pre.textContent = e.data + "\\n" + pre.textContent.slice(0, 5000);
+};
+</script>
+</body></html>
+"""
+
+
+class StreamHub:
+    """Раздача кадров и событий подключенным клиентам в цикле asyncio.
+
+    Поток трекинга публикует через publish_frame и publish_event
+    (call_soon_threadsafe). Каждому зрителю отдается только последний
+    кадр: медленный клиент пропускает кадры и не задерживает остальных.
+    Очередь событий у каждого клиента своя и ограничена.
+    """
+
+    def __init__(self, loop, event_queue_size=100):
+        self.loop = loop
+        self.event_queue_size = event_queue_size
+        self.jpeg = None
+        self.frame_seq = 0
+        self.frame_ready = asyncio.Event()
+        self.event_queues = set()
+        self.viewers = 0  # читается потоком трекинга без блокировки
+
+    def publish_frame(self, jpeg):
+        self.loop.call_soon_threadsafe(self._set_frame, jpeg)
+
+    def _set_frame(self, jpeg):
+        self.jpeg = jpeg
+        self.frame_seq += 1
+        # Будим всех ожидающих и заводим новое событие для следующего кадра
+        self.frame_ready.set()
+        self.frame_ready = asyncio.Event()
+
+    async def next_frame(self, last_seq):
+        while self.frame_seq == last_seq:
+            await self.frame_ready.wait()
+        return self.frame_seq, self.jpeg
+
+    def publish_event(self, event):
+        self.loop.call_soon_threadsafe(self._put_event, event)
+
+    def _put_event(self, event):
+        for events in self.event_queues:
+            if events.full():
+                events.get_nowait()
+            events.put_nowait(event)
+
+    def subscribe(self):
+        events = asyncio.Queue(maxsize=self.event_queue_size)
+        self.event_queues.add(events)
+        return events
+
+    def unsubscribe(self, events):
+        self.event_queues.discard(events)
+
+
+class TrackingPipeline:
+    """Захват, model.track и сохранение снимков в фоновом потоке без окон.
+
+    Аннотированный кадр рисуется, только когда есть зрители, и не чаще
+    stream_fps; сжатие в JPEG выполняется в отдельном потоке, поэтому
+    число зрителей не влияет на цикл нейросети. Модель переключается без
+    остановки: новая загружается в фоне, старая работает до ее готовности.
+    """
+
+    def __init__(self, hub, models_dir="neural_network_models", output_dir="result_images", sink="json",
+                 stream_fps=10.0, jpeg_quality=80, commit_timeout=10.0, location=None, dedup_radius=15.0,
+                 roi=None, max_side=None, mask=None):
+        self.hub = hub
+        self.models_dir = models_dir
+        self.registry = ModelRegistry()
+        self.metrics = PipelineMetrics()
+        # location - спецификация источника координат для create_location_source
+        location_source = create_location_source(location)
+        self.location = LocationService(location_source) if location_source else None
+        # Повторы уже сохраненных дефектов отсекаются по координатам (только точным)
+        self.dedup = None
+        if self.location and self.location.precise and dedup_radius:
+            self.dedup = SpatialDedup(os.path.join(output_dir, "spatial_index.sqlite"), dedup_radius)
+        self.writer = DetectionWriter(output_dir, sink=sink, metrics=self.metrics, location=self.location,
+                                      dedup=self.dedup)
+        self.selector = BestFrameSelector(end_after=1.0, commit_timeout=commit_timeout)
+        # В модель подается только область дороги (с маской), уменьшенная до max_side
+        self.preprocess = RoiPreprocessor(roi, max_side, mask)
+        # Срок хранения в кадрах трекера, чтобы вернувшийся трек не сохранялся повторно
+        self.track_history = TrackStore(max_points=30, ttl_frames=2 * TRACK_BUFFER)
+        self.saved_track_ids = set()
+        self.stream_interval = 1.0 / stream_fps if stream_fps > 0 else 0.0
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.lock = threading.Lock()
+
+        self.source = None
+        self.grabber = None
+        self.model = None
+        self.model_name = None
+        self.next_model = None  # (имя, Future) модели, ожидающей загрузки
+        self.renderer = None
+        self.thread = None
+        self.running = False
+        self.error = None
+
+        # Кадр для сжатия в JPEG (только последний)
+        self.stream_frame = None
+        self.stream_ready = threading.Condition(self.lock)
+        self.last_stream_time = 0.0
+        self.encoder = threading.Thread(target=self._encode_loop, name="StreamEncoder", daemon=True)
+        self.encoder.start()
+
+        # Счетчики
+        self.frames = 0
+        self.detections = 0
+        self.latency = 0.0
+        self.start_time = None
+        self.metrics.gauge("writer_queue", lambda: self.writer.queue.qsize())
+        self.metrics.gauge("dropped_capture", lambda: self.grabber.dropped if self.grabber else 0)
+        self.metrics.gauge("dropped_writer", lambda: self.writer.dropped)
+        self.metrics.gauge("viewers", lambda: self.hub.viewers)
+
+    def model_path(self, name):
+        if name not in list_models(self.models_dir):
+            raise ValueError(f"Модель не найдена: {name}")
+        return os.path.join(self.models_dir, name)
+
+    def start(self, source, model_name):
+        # Блокирует до загрузки модели и открытия камеры; вызывать вне цикла asyncio
+        if self.running:
+            raise RuntimeError("Трекинг уже запущен")
+        model = self.registry.get(self.model_path(model_name))
+        reset_trackers(model)
+        grabber = FrameGrabber(source, metrics=self.metrics)
+        if not grabber.isOpened():
+            grabber.release()
+            raise RuntimeError(f"Не удалось открыть источник {source}")
+        self.source = source
+        self.grabber = grabber
+        self.model = model
+        self.model_name = model_name
+        self.renderer = OverlayRenderer(model.names)
+        self.track_history.clear()
+        self.saved_track_ids.clear()
+        self.frames = 0
+        self.error = None
+        self.start_time = time.perf_counter()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="TrackingPipeline", daemon=True)
+        self.thread.start()
+
+    def switch_model(self, model_name):
+        # Фоновая загрузка; цикл переключится, когда модель будет готова
+        self.next_model = (model_name, self.registry.preload(self.model_path(model_name)))
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.grabber is not None:
+            self.grabber.release()
+            self.grabber = None
+        self.commit_candidates(self.selector.flush())
+
+    def _maybe_switch_model(self):
+        if self.next_model is None or not self.next_model[1].done():
+            return
+        name, future = self.next_model
+        self.next_model = None
+        if future.exception() is not None:
+            self.hub.publish_event({"event": "model_error", "model": name, "error": str(future.exception())})
+            return
+        # Идентификаторы треков начнутся заново: лучшие кадры старых треков
+        # сохраняются сейчас, а отметки о сохранении сбрасываются, как в start
+        self.commit_candidates(self.selector.flush())
+        self.model = future.result()
+        reset_trackers(self.model)
+        self.renderer = OverlayRenderer(self.model.names)
+        self.model_name = name
+        self.track_history.clear()
+        self.saved_track_ids.clear()
+        self.hub.publish_event({"event": "model", "model": name})
+
+    def _run(self):
+        last_frame_id = None
+        try:
+            while self.running:
+                frame_id, frame = self.grabber.read_latest(timeout=1.0)
+                if frame is None or frame_id == last_frame_id:
+                    if not self.grabber.isOpened():
+                        break
+                    continue
+                last_frame_id = frame_id
+                self._maybe_switch_model()
+                self.process_frame(frame, self.grabber.capture_time(frame_id))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.running = False
+            self.hub.publish_event({"event": "stopped", "error": str(self.error) if self.error else None})
+
+    def process_frame(self, frame, captured_at=None):
+        # captured_at - время захвата кадра; к нему привязывается время обнаружения
+        results = self.preprocess.track(self.model, frame, self.metrics, persist=True, verbose=False)
+        self.latency = self.preprocess.latency
+        record_track_timing(self.metrics, results, self.latency)
+        self.frames += 1
+
+        self.saved_track_ids.difference_update(self.track_history.evict())
+        result = results[0]
+        if result.boxes is not None and result.boxes.id is not None:
+            boxes = result.boxes.xywh.cpu()
+            track_ids = result.boxes.id.int().cpu().tolist()
+            class_ids = result.boxes.cls.int().cpu().tolist()
+            confidences = result.boxes.conf.cpu().tolist()
+            for box, track_id, cls, conf in zip(boxes, track_ids, class_ids, confidences):
+                x, y, w, h = box
+                self.track_history.add(track_id, float(x), float(y))
+                if track_id not in self.saved_track_ids:
+                    label = self.model.names[cls]
+                    self.selector.observe(track_id, label, frame, (float(x), float(y), float(w), float(h)), conf,
+                                          now=captured_at)
+        self.commit_candidates(self.selector.poll(captured_at))
+
+        # Кадр для трансляции рисуется, только если его кто-то смотрит
+        now = time.perf_counter()
+        if self.hub.viewers and now - self.last_stream_time >= self.stream_interval:
+            self.last_stream_time = now
+            with self.metrics.timer("draw"):
+                annotated = self.renderer.render(frame, result, self.track_history)
+            with self.lock:
+                self.stream_frame = annotated
+                self.stream_ready.notify()
+
+    def commit_candidates(self, candidates):
+        for candidate in candidates:
+            self.writer.submit(candidate.frame, candidate.box, candidate.label, candidate.track_id,
+                               extra={"Confidence": round(candidate.confidence, 3)},
+                               detected_at=datetime.fromtimestamp(candidate.timestamp),
+                               on_saved=partial(self.on_saved, candidate))
+            self.saved_track_ids.add(candidate.track_id)
+
+    def on_saved(self, candidate, base_filename):
+        # Вызывается потоком записи только для записанных файлов: повтор
+        # известного дефекта не попадает в события
+        with self.lock:
+            self.detections += 1
+        self.hub.publish_event({
+            "event": "detection",
+            "ImageName": f"{base_filename}.jpg",
+            "ClassName": candidate.label,
+            "TrackId": candidate.track_id,
+            "Confidence": round(candidate.confidence, 3),
+            "DateTimeDetection": datetime.fromtimestamp(candidate.timestamp).isoformat(),
+        })
+
+    def _encode_loop(self):
+        while True:
+            with self.lock:
+                while self.stream_frame is None:
+                    self.stream_ready.wait()
+                frame = self.stream_frame
+                self.stream_frame = None
+            if frame is False:
+                break
+            with self.metrics.timer("stream_encode"):
+                ok, jpeg = cv2.imencode(".jpg", frame, self.encode_params)
+            if ok:
+                self.hub.publish_frame(jpeg.tobytes())
+
+    def status(self):
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0.0
+        return {
+            "running": self.running,
+            "source": self.source,
+            "model": self.model_name,
+            "next_model": self.next_model[0] if self.next_model else None,
+            "frames": self.frames,
+            "fps": round(self.frames / elapsed, 1) if elapsed > 0 else 0.0,
+            "latency_ms": round(self.latency * 1000, 1),
+            "detections": self.detections,
+            "viewers": self.hub.viewers,
+            "event_clients": len(self.hub.event_queues),
+            "error": str(self.error) if self.error else None,
+            "grabber": self.grabber.stats() if self.grabber else None,
+            "writer": self.writer.stats(),
+            "location": self.location.stats() if self.location else None,
+            "roi": self.preprocess.stats() if self.preprocess.active else None,
+            "registry": self.registry.stats(),
+            "metrics": self.metrics.snapshot(),
+        }
+
+    def close(self):
+        self.stop()
+        with self.lock:
+            self.stream_frame = False
+            self.stream_ready.notify()
+        self.encoder.join()
+        self.writer.close()
+        if self.location:
+            self.location.close()
+        if self.dedup:
+            self.dedup.close()
+        self.registry.shutdown()
+
+
+class TrackingServer:
+    """Локальный HTTP API сервиса трекинга (asyncio, без сторонних библиотек).
+
+    GET  /              страница с трансляцией и событиями
+    GET  /status        состояние конвейера (JSON)
+    GET  /models        доступные модели
+    POST /start         {"source": 0, "model": "yolov8n.pt"}
+    POST /stop
+    POST /model         {"model": "yolov8n.onnx"}
+    GET  /stream.mjpg   трансляция аннотированных кадров (MJPEG)
+    GET  /events        новые обнаружения (Server-Sent Events)
+    GET  /metrics       время этапов, частота и очереди (текст Prometheus)
+    """
+
+    def __init__(self, pipeline, hub, default_source=0, default_model=None):
+        self.pipeline = pipeline
+        self.hub = hub
+        self.default_source = default_source
+        self.default_model = default_model
+        # running выставляется только в конце start (после загрузки модели и
+        # открытия камеры), поэтому запуск и остановка выполняются по очереди
+        self.start_lock = asyncio.Lock()
+
+    async def start(self, source, model):
+        # Запуск из /start и --autostart; ошибка, если трекинг уже запущен
+        loop = asyncio.get_running_loop()
+        async with self.start_lock:
+            if self.pipeline.running:
+                raise RuntimeError("Трекинг уже запущен")
+            # Загрузка модели и открытие камеры не блокируют цикл asyncio
+            await loop.run_in_executor(None, self.pipeline.start, source, model)
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = b""
+            length = int(headers.get("content-length", 0))
+            if length:
+                body = await reader.readexactly(length)
+            url = urlsplit(target)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if body:
+                data = json.loads(body)
+                if not isinstance(data, dict):
+                    raise ValueError("Тело запроса должно быть объектом JSON")
+                params.update(data)
+            await self.route(method, url.path, params, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            await self.send_json(writer, {"error": str(e)}, status="400 Bad Request")
+        finally:
+            writer.close()
+
+    async def route(self, method, path, params, reader, writer):
+        loop = asyncio.get_running_loop()
+        if method == "GET" and path == "/":
+            await self.send(writer, INDEX_PAGE.encode("utf-8"), "text/html; charset=utf-8")
+        elif method == "GET" and path == "/status":
+            await self.send_json(writer, self.pipeline.status())
+        elif method == "GET" and path == "/metrics":
+            body = self.pipeline.metrics.prometheus().encode("utf-8")
+            await self.send(writer, body, "text/plain; version=0.0.4")
+        elif method == "GET" and path == "/models":
+            await self.send_json(writer, {"models": list_models(self.pipeline.models_dir)})
+        elif method == "POST" and path == "/start":
+            source = params.get("source", self.default_source)
+            source = int(source) if str(source).isdigit() else source
+            model = params.get("model", self.default_model)
+            if self.pipeline.running or self.start_lock.locked():
+                await self.send_json(writer, {"error": "Трекинг уже запущен"}, status="409 Conflict")
+                return
+            try:
+                await self.start(source, model)
+            except ValueError as e:
+                await self.send_json(writer, {"error": str(e)}, status="400 Bad Request")
+                return
+            except Exception as e:
+                # Ошибка загрузки модели или открытия источника
+                await self.send_json(writer, {"error": str(e)}, status="500 Internal Server Error")
+                return
+            await self.send_json(writer, self.pipeline.status())
+        elif method == "POST" and path == "/stop":
+            async with self.start_lock:
+                await loop.run_in_executor(None, self.pipeline.stop)
+            await self.send_json(writer, self.pipeline.status())
+        elif method == "POST" and path == "/model":
+            self.pipeline.switch_model(params.get("model"))
+            await self.send_json(writer, self.pipeline.status())
+        elif method == "GET" and path == "/stream.mjpg":
+            await self.stream(reader, writer)
+        elif method == "GET" and path == "/events":
+            await self.events(writer)
+        else:
+            await self.send_json(writer, {"error": "not found"}, status="404 Not Found")
+
+    async def send(self, writer, body, content_type, status="200 OK"):
+        writer.write((f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                      f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def send_json(self, writer, data, status="200 OK"):
+        body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+        await self.send(writer, body, "application/json; charset=utf-8", status)
+
+    async def stream(self, reader, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        self.hub.viewers += 1
+        try:
+            seq = 0
+            while True:
+                try:
+                    seq, jpeg = await asyncio.wait_for(self.hub.next_frame(seq), timeout=1.0)
+                except asyncio.TimeoutError:
+                    # Пока кадров нет, отключение зрителя замечается по закрытию
+                    # соединения, а не при следующей записи: иначе кадры
+                    # рисовались бы и сжимались для отключившегося клиента
+                    if writer.is_closing() or reader.at_eof():
+                        break
+                    continue
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                             + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                await writer.drain()
+        finally:
+            self.hub.viewers -= 1
+
+    async def events(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        events = self.hub.subscribe()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    # Комментарий SSE, чтобы соединение не закрывалось по простою
+                    writer.write(b": keepalive\n\n")
+                else:
+                    writer.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                await writer.drain()
+        finally:
+            self.hub.unsubscribe(events)
+
+
+async def serve(args):
+    loop = asyncio.get_running_loop()
+    hub = StreamHub(loop)
+    pipeline = TrackingPipeline(hub, args.models_dir, args.output_dir, args.sink, args.stream_fps,
+                                location=args.location, dedup_radius=args.dedup_radius,
+                                roi=parse_roi(args.roi), max_side=args.max_side, mask=parse_mask(args.roi_mask))
+    source = int(args.source) if args.source.isdigit() else args.source
+    server = TrackingServer(pipeline, hub, source, args.model)
+    dumper = MetricsDumper(pipeline.metrics, args.metrics_file, args.metrics_interval) if args.metrics_file else None
+    http = await asyncio.start_server(server.handle, args.host, args.port)
+    print(f"Сервис трекинга: http://{args.host}:{args.port}/")
+    try:
+        if args.autostart:
+            await server.start(source, args.model)
+        async with http:
+            await http.serve_forever()
+    finally:
+        await loop.run_in_executor(None, pipeline.close)
+        if dumper:
+            dumper.close()
+        print(f"Итог: {pipeline.status()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Трекинг без окон с локальным HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--source", default="0", help="номер камеры или путь к видеофайлу")
+    parser.add_argument("--model", default="yolov8n.pt", help="имя модели в папке моделей")
+    parser.add_argument("--models-dir", default="neural_network_models")
+    parser.add_argument("--output-dir", default="result_images")
+    parser.add_argument("--sink", choices=["json", "jsonl", "sqlite"], default="json",
+                        help="формат журнала обнаружений")
+    parser.add_argument("--stream-fps", type=float, default=10.0, help="частота кадров трансляции")
+    parser.add_argument("--location", help='источник координат: "ip", "nmea:/dev/ttyUSB0" или "replay:points.csv"')
+    parser.add_argument("--dedup-radius", type=float, default=15.0,
+                        help="радиус повторов одного дефекта, м (0 - отключено; нужен --location с GPS, не ip)")
+    parser.add_argument("--roi", help='область кадра для нейросети "x1,y1,x2,y2" в долях, например "0,0.4,1,1"')
+    parser.add_argument("--max-side", type=int, help="уменьшать изображение для нейросети до этой стороны, пикс.")
+    parser.add_argument("--roi-mask",
+                        help='маска дороги "x,y;x,y;..." в долях кадра, например "0,1;0.4,0.4;0.6,0.4;1,1"')
+    parser.add_argument("--metrics-file", help="файл для периодической записи метрик (.json или .prom)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="период записи метрик, с")
+    parser.add_argument("--autostart", action="store_true", help="запустить трекинг сразу")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
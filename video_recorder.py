@@ -0,0 +1,178 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+# Предустановки кодеков: (fourcc, расширение файла, бэкенд VideoWriter)
+CODEC_PRESETS = {
+    "xvid": ("XVID", ".avi", None),
+    "mjpg": ("MJPG", ".avi", None),
+    "mp4v": ("mp4v", ".mp4", None),
+    "h264": ("avc1", ".mp4", cv2.CAP_FFMPEG),
+}
+FALLBACK_PRESET = "mp4v"
+
+
+class VideoRecorder:
+    """Запись видео в отдельном потоке.
+
+    Кадры ставятся в ограниченную очередь вместе со временем захвата; если
+    запись не успевает, новые кадры отбрасываются и учитываются. Размер
+    берется из первого кадра (кадры другого размера масштабируются), а
+    кадры дублируются или пропускаются по времени захвата, чтобы файл
+    проигрывался с реальной скоростью при заданной fps. Файл делится на
+    части по длительности (segment_seconds) или размеру (segment_mb).
+    """
+
+    def __init__(self, output_dir="result", fps=20.0, size=None, preset="xvid",
+                 segment_seconds=None, segment_mb=None, queue_size=64):
+        if preset not in CODEC_PRESETS:
+            raise ValueError(f"Неизвестный кодек: {preset}")
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.fps = fps if fps and fps > 0 else 20.0
+        self.size = size
+        self.preset = preset
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_mb * 1024 * 1024 if segment_mb else None
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+
+        self.writer = None
+        self.filename = None
+        self.files = []
+        self.segment_start = None  # время захвата первого кадра части
+        self.segment_frames = 0
+
+        # Счетчики
+        self.submitted = 0
+        self.written = 0
+        self.duplicated = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.error = None
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="VideoRecorder", daemon=True)
+        self.thread.start()
+
+    def write(self, frame, timestamp=None):
+        # Вызывается из цикла отображения; возвращает False, если кадр отброшен
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        try:
+            self.queue.put_nowait((frame, timestamp))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+        with self.lock:
+            self.submitted += 1
+        return True
+
+    def _open_segment(self):
+        if self.writer is not None:
+            self.writer.release()
+        preset = self.preset
+        fourcc, extension, backend = CODEC_PRESETS[preset]
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = os.path.join(self.output_dir, f"video_{timestamp}{extension}")
+        suffix = 1
+        while filename in self.files or os.path.exists(filename):
+            filename = os.path.join(self.output_dir, f"video_{timestamp}_{suffix}{extension}")
+            suffix += 1
+        if backend is not None:
+            writer = cv2.VideoWriter(filename, backend, cv2.VideoWriter_fourcc(*fourcc), self.fps, self.size)
+        else:
+            writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*fourcc), self.fps, self.size)
+        if not writer.isOpened() and preset != FALLBACK_PRESET:
+            # Например, OpenCV собран без FFmpeg/H.264
+            fourcc, extension, _ = CODEC_PRESETS[FALLBACK_PRESET]
+            filename = os.path.splitext(filename)[0] + extension
+            writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*fourcc), self.fps, self.size)
+            self.preset = FALLBACK_PRESET
+        if not writer.isOpened():
+            raise RuntimeError(f"Не удалось открыть файл записи {filename}")
+        self.writer = writer
+        self.filename = filename
+        self.files.append(filename)
+        self.segment_start = None
+        self.segment_frames = 0
+
+    def _segment_full(self):
+        if self.segment_seconds and self.segment_frames >= self.segment_seconds * self.fps:
+            return True
+        if self.segment_bytes and self.segment_frames % max(int(self.fps), 1) == 0:
+            try:
+                return os.path.getsize(self.filename) >= self.segment_bytes
+            except OSError:
+                return False
+        return False
+
+    def _write_frame(self, frame, timestamp):
+        if self.size is None:
+            self.size = (frame.shape[1], frame.shape[0])
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size)
+        if self.writer is None or self._segment_full():
+            self._open_segment()
+        if self.segment_start is None:
+            self.segment_start = timestamp
+
+        # Номер кадра в файле, соответствующий времени захвата
+        target = int((timestamp - self.segment_start) * self.fps)
+        if target < self.segment_frames:
+            with self.lock:
+                self.skipped += 1
+            return
+        repeats = target - self.segment_frames + 1
+        if repeats > self.fps:
+            # Долгая пауза в потоке кадров: не заполняем ее копиями кадра
+            self.segment_start += (repeats - 1) / self.fps
+            repeats = 1
+        for _ in range(repeats):
+            self.writer.write(frame)
+        self.segment_frames += repeats
+        with self.lock:
+            self.written += 1
+            self.duplicated += repeats - 1
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                if not self.running:
+                    break
+                continue
+            try:
+                self._write_frame(*item)
+            except Exception as e:
+                self.error = e
+                self.running = False
+                break
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "file": self.filename,
+                "files": len(self.files),
+                "submitted": self.submitted,
+                "written": self.written,
+                "duplicated": self.duplicated,
+                "skipped": self.skipped,
+                "dropped": self.dropped,
+                "queue_depth": self.queue.qsize(),
+            }
+
+    def close(self):
+        # Дописывает кадры из очереди и закрывает файл. Поток сам завершается,
+        # когда очередь пуста и running сброшен; без метки конца в очереди
+        # close не зависает, если поток уже вышел по ошибке при полной очереди
+        self.running = False
+        self.thread.join()
@@ -5,7 +5,7 @@ from PIL import Image, ImageTk
 import os
 from datetime import datetime
 import glob
-from ultralytics import YOLO
+from startup_profile import preload_modules
 from collections import defaultdict
 import numpy as np
 import uuid
@@ -120,6 +120,8 @@ class WebcamApp:
             return
         try:
             model_path = os.path.join("neural_network_models", selected_model)
+            # ultralytics (и torch) импортируется только при применении нейросети
+            from ultralytics import YOLO
             self.model = YOLO(model_path)
             self.use_network = True
             self.info_label.config(text=f"Модель {selected_model} применяется")
@@ -163,7 +165,7 @@ class WebcamApp:
                             cv2.polylines(display_frame, [points], isClosed=False, color=(230, 230, 230), thickness=10)
                             
                             if track_id not in self.saved_track_ids:
-                                label = self.model.model.names[cls]
+                                label = self.model.names[cls]
                                 annotated_frame = frame.copy()
                                 cv2.rectangle(annotated_frame, (int(x - w / 2), int(y - h / 2)), 
                                             (int(x + w / 2), int(y + h / 2)), (0, 255, 0), 2)
@@ -223,4 +225,6 @@ class WebcamApp:
 if __name__ == "__main__":
     root = tk.Tk()
     app = WebcamApp(root)
+    # Фоновая загрузка ultralytics после появления окна
+    root.after(500, preload_modules)
     root.mainloop()
\ No newline at end of file
@@ -1,15 +1,67 @@
+from startup_profile import StartupProfile
+# Отсчет времени запуска идет от этой строки; ultralytics и torch
+# импортируются только в фоне после появления окна
+startup = StartupProfile()
+startup.import_modules("tkinter", "numpy", "cv2", "PIL.ImageTk")
 import cv2
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
 import os
+from collections import deque
+from functools import partial
+from frame_grabber import FrameGrabber
+from inference_worker import InferenceWorker
+from detection_saver import DetectionWriter
+from track_store import TRACK_BUFFER, TrackStore
+from overlay_renderer import OverlayRenderer
+from display_backend import create_display
+from video_recorder import VideoRecorder
+from event_clip import EventClipBuffer
+from best_frame import BestFrameSelector
 from datetime import datetime
-import glob
-from ultralytics import YOLO
-from collections import defaultdict
-import numpy as np
-import uuid
-import json
+from model_registry import ModelRegistry, list_models, reset_trackers
+from camera_discovery import CameraDiscovery
+from pipeline_metrics import PipelineMetrics
+from location_service import LocationService, create_location_source
+from spatial_dedup import SpatialDedup
+from roi_preprocess import RoiPreprocessor
+startup.mark("imports")
+
+# Формат журнала обнаружений: "json" (файл на объект), "jsonl" или "sqlite"
+DETECTION_SINK = "json"
+# Вывод видео: "tk" (в окне приложения) или "opencv" (отдельное окно OpenCV)
+DISPLAY_BACKEND = "tk"
+# Запись видео: кодек ("xvid", "mjpg", "mp4v", "h264") и деление на части
+RECORDING_PRESET = "xvid"
+RECORDING_SEGMENT_SECONDS = 600  # None - одним файлом
+RECORDING_SEGMENT_MB = None
+# Классы, для которых сохраняется клип 5 с до и 5 с после появления объекта,
+# например {"pothole"}; None - клипы не сохраняются
+EVENT_CLIP_CLASSES = None
+EVENT_CLIP_BUDGET_MB = 64
+# Снимок трека - лучший кадр, сохраняется после исчезновения трека или через столько секунд
+BEST_FRAME_TIMEOUT = 10.0
+# Найденные камеры и их возможности кэшируются между запусками
+CAMERA_CACHE = "camera_cache.json"
+# Через сколько миллисекунд после появления окна начинается фоновая загрузка нейросети
+PRELOAD_DELAY_MS = 500
+STARTUP_REPORT = os.path.join("result", "startup_report.json")
+# Время этапов (p50/p95/p99), частота кадров и очереди под информационной панелью
+SHOW_METRICS = True
+# Источник координат для обнаружений: None, "ip", "nmea:/dev/ttyUSB0" или "replay:points.csv"
+LOCATION_SOURCE = None
+# Дефект того же класса ближе этого расстояния (м) к уже сохраненному не сохраняется
+# повторно, а учитывается в result_images/spatial_index.sqlite; None - отключено.
+# Работает, только если задан точный источник координат (GPS), но не "ip".
+DEDUP_RADIUS_M = 15.0
+# Область кадра для нейросети (x1, y1, x2, y2) в долях кадра, например (0.0, 0.4, 1.0, 1.0) -
+# нижние 60% кадра с дорогой; None - весь кадр. Снимки сохраняются с полного кадра.
+INFERENCE_ROI = None
+# Наибольшая сторона изображения для нейросети, пикс. (например, 640); None - без уменьшения
+INFERENCE_MAX_SIDE = None
+# Маска дороги [(x, y), ...] в долях кадра: точки вне многоугольника закрашиваются
+# черным, например [(0.0, 1.0), (0.4, 0.4), (0.6, 0.4), (1.0, 1.0)]; None - без маски
+INFERENCE_MASK = None
 
 class WebcamApp:
     def __init__(self, window):
@@ -18,18 +70,41 @@ class WebcamApp:
         
         # Переменные состояния
         self.vid = None
+        self.last_frame_id = None
         self.recording = False
         self.showing = False
-        self.out = None
+        self.recorder = None
         self.model = None
+        self.worker = None
+        self.renderer = None
+        self.last_result_id = None
+        self.last_results = None
         self.use_network = False
-        self.track_history = defaultdict(lambda: [])
+        self.pending_model = None  # Future модели, которая загружается для применения
+        # История треков; трек удаляется, когда трекер уже не может вернуть
+        # его id (срок в кадрах трекера, с запасом)
+        self.track_history = TrackStore(max_points=30, ttl_frames=2 * TRACK_BUFFER)
         self.saved_track_ids = set()
+        self.saved_names = deque()  # записанные снимки, о которых сообщает поток записи
         
         # Создание папок
         for directory in ["result", "result_images"]:
             if not os.path.exists(directory):
                 os.makedirs(directory)
+        self.metrics = PipelineMetrics()
+        # Координаты получаются в фоне, при сохранении берутся из кэша
+        location_source = create_location_source(LOCATION_SOURCE)
+        self.location = LocationService(location_source) if location_source else None
+        self.dedup = None
+        if self.location and self.location.precise and DEDUP_RADIUS_M:
+            self.dedup = SpatialDedup(os.path.join("result_images", "spatial_index.sqlite"), DEDUP_RADIUS_M)
+        self.writer = DetectionWriter("result_images", sink=DETECTION_SINK, metrics=self.metrics,
+                                      location=self.location, dedup=self.dedup)
+        self.selector = BestFrameSelector(end_after=1.0, commit_timeout=BEST_FRAME_TIMEOUT)
+        self.clips = None
+        if EVENT_CLIP_CLASSES is not None:
+            self.clips = EventClipBuffer("result_images", byte_budget_mb=EVENT_CLIP_BUDGET_MB,
+                                         classes=EVENT_CLIP_CLASSES, max_delay=BEST_FRAME_TIMEOUT + 1.0)
             
         # Настройка стилей для кнопок в стиле Bootstrap
         style = ttk.Style()
@@ -51,13 +126,15 @@ class WebcamApp:
         # Выпадающий список камер
         ttk.Label(self.control_frame, text="Выберите камеру:", font=("Helvetica", 12)).pack(side="left", padx=10)
         self.camera_var = tk.IntVar()
-        self.cameras = self.list_available_cameras()
+        # Камеры опрашиваются в фоне, сразу показывается список из кэша
+        self.discovery = CameraDiscovery(cache_path=CAMERA_CACHE)
+        self.camera_version = None
+        self.cameras = self.discovery.indices() or [0]
         self.camera_combo = ttk.Combobox(self.control_frame, textvariable=self.camera_var, 
                                        values=self.cameras, state="readonly", font=("Helvetica", 12), width=10)
         self.camera_combo.pack(side="left", padx=10)
-        if self.cameras:
-            self.camera_var.set(self.cameras[0])
-            self.camera_combo.bind("<<ComboboxSelected>>", self.change_camera)
+        self.camera_var.set(self.cameras[0])
+        self.camera_combo.bind("<<ComboboxSelected>>", self.change_camera)
         
         # Кнопка показа видео
         self.toggle_button = ttk.Button(self.control_frame, text="Показать видео", 
@@ -78,6 +155,13 @@ class WebcamApp:
         self.model_combo.pack(side="left", padx=10)
         if self.models:
             self.model_combo.set(self.models[0])
+        # Выбранная модель загружается и прогревается в фоне заранее
+        self.registry = ModelRegistry()
+        self.model_combo.bind("<<ComboboxSelected>>", self.preload_model)
+        # Время появления окна отмечается по событию <Map>, фоновая загрузка
+        # планируется отдельно и на эту отметку не влияет
+        self.window.bind("<Map>", self.on_map, add="+")
+        self.window.after(PRELOAD_DELAY_MS, self.start_preload)
             
         # Кнопка применения/прекращения нейросети
         self.network_button = ttk.Button(self.control_frame, text="Применить", 
@@ -86,39 +170,70 @@ class WebcamApp:
         
         # Область видео
         self.canvas = tk.Canvas(window, width=640, height=480)
-        self.canvas.pack(pady=10)
+        self.canvas.pack(pady=10, fill="both", expand=True)
+        # Изображение на холсте обновляется на месте и масштабируется под его размер
+        self.display = create_display(DISPLAY_BACKEND, self.canvas)
         
         # Информационная панель
         self.info_frame = ttk.Frame(window)
         self.info_frame.pack(fill="x", pady=10)
         self.info_label = ttk.Label(self.info_frame, text="Готово к работе", wraplength=600, font=("Helvetica", 12))
         self.info_label.pack()
+        self.metrics_label = ttk.Label(self.info_frame, text="", wraplength=900, font=("Helvetica", 9))
+        if SHOW_METRICS:
+            self.metrics_label.pack()
+        self.register_gauges()
         
         self.init_camera()
+        self.discovery.start()
+        self.refresh_cameras()
+        self.refresh_metrics()
         self.update()
         
         self.window.protocol("WM_DELETE_WINDOW", self.on_closing)
         
-    def list_available_cameras(self):
-        max_cameras_to_check = 10
-        available_cameras = []
-        for i in range(max_cameras_to_check):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                available_cameras.append(i)
-                cap.release()
-        return available_cameras if available_cameras else [0]
+    def register_gauges(self):
+        # Глубина очередей и отброшенные кадры читаются при обновлении метрик
+        self.metrics.gauge("inference_queue", lambda: self.worker.pending() if self.worker else 0)
+        self.metrics.gauge("writer_queue", lambda: self.writer.queue.qsize())
+        self.metrics.gauge("recorder_queue", lambda: self.recorder.queue.qsize() if self.recorder else 0)
+        self.metrics.gauge("dropped_capture", lambda: self.vid.dropped if self.vid else 0)
+        self.metrics.gauge("dropped_inference", lambda: self.worker.dropped if self.worker else 0)
+        self.metrics.gauge("dropped_writer", lambda: self.writer.dropped)
+        
+    def refresh_metrics(self):
+        if SHOW_METRICS:
+            self.metrics_label.config(text=self.metrics.summary())
+        self.window.after(1000, self.refresh_metrics)
+        
+    def refresh_cameras(self):
+        # Список камер обновляется при подключении и отключении устройств
+        if self.discovery.version != self.camera_version:
+            self.camera_version = self.discovery.version
+            self.cameras = self.discovery.indices() or [0]
+            self.camera_combo.config(values=self.cameras)
+            if self.vid is None and self.camera_var.get() not in self.cameras:
+                self.camera_var.set(self.cameras[0])
+                self.init_camera()
+        self.window.after(1000, self.refresh_cameras)
         
     def init_camera(self):
         if self.vid:
             self.vid.release()
+            self.discovery.set_busy(self.vid.source, False)
         camera_index = self.camera_var.get()
-        self.vid = cv2.VideoCapture(camera_index)
+        # Захват идет в фоновом потоке, в цикле update берется только свежий кадр
+        self.vid = FrameGrabber(camera_index, metrics=self.metrics)
+        self.last_frame_id = None
         if not self.vid.isOpened():
+            self.vid.release()
             self.info_label.config(text=f"Ошибка: Не удалось подключиться к камере {camera_index}")
             self.vid = None
         else:
-            self.info_label.config(text=f"Камера {camera_index} успешно инициализирована")
+            self.discovery.set_busy(camera_index)
+            info = self.discovery.info(camera_index)
+            description = info.describe() if info else camera_index
+            self.info_label.config(text=f"Камера {description} успешно инициализирована")
             
     def change_camera(self, event):
         if self.recording:
@@ -131,8 +246,26 @@ class WebcamApp:
     def get_model_list(self):
         if not os.path.exists("neural_network_models"):
             os.makedirs("neural_network_models")
-        models = glob.glob("neural_network_models/*.pth") + glob.glob("neural_network_models/*.pt")
-        return [os.path.basename(m) for m in models] or ["Нет моделей"]
+        # PyTorch, ONNX и OpenVINO модели (см. export_models.py)
+        return list_models("neural_network_models") or ["Нет моделей"]
+        
+    def on_map(self, event):
+        # Привязка к корневому окну получает и события дочерних виджетов
+        if event.widget is self.window:
+            startup.mark("window")
+
+    def start_preload(self):
+        # Окно уже на экране: тяжелые модули и выбранная модель грузятся в фоне
+        startup.preload()
+        self.preload_model()
+        
+    def preload_model(self, event=None):
+        selected_model = self.model_var.get()
+        if selected_model == "Нет моделей":
+            return
+        model_path = os.path.join("neural_network_models", selected_model)
+        if os.path.exists(model_path):
+            self.registry.preload(model_path)
         
     def toggle_video(self):
         if not self.vid:
@@ -148,23 +281,35 @@ class WebcamApp:
         self.recording = not self.recording
         self.record_button.config(text="Остановить запись" if self.recording else "Записывать")
         if self.recording:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"result/video_{timestamp}.avi"
-            fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            self.out = cv2.VideoWriter(filename, fourcc, 20.0, (640, 480))
-            self.info_label.config(text=f"Начата запись: {filename}")
+            # Размер и частота кадров берутся у реальной камеры
+            fps = self.vid.fps or self.vid.get(cv2.CAP_PROP_FPS)
+            size = (int(self.vid.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.vid.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            self.recorder = VideoRecorder("result", fps=fps, size=size if all(size) else None,
+                                          preset=RECORDING_PRESET, segment_seconds=RECORDING_SEGMENT_SECONDS,
+                                          segment_mb=RECORDING_SEGMENT_MB)
+            self.info_label.config(text=f"Начата запись: {size[0]}x{size[1]}, {self.recorder.fps:.1f} кадров/с")
         else:
-            if self.out:
-                self.out.release()
-                self.out = None
-            self.info_label.config(text="Запись остановлена")
+            self.stop_recorder()
+            
+    def stop_recorder(self):
+        if self.recorder:
+            self.recorder.close()
+            stats = self.recorder.stats()
+            self.recorder = None
+            self.info_label.config(text=f"Запись остановлена: файлов {stats['files']}, "
+                                        f"кадров {stats['written']}, пропущено {stats['dropped']}")
                 
     def toggle_network(self):
         if not self.vid or not self.showing:
             self.info_label.config(text="Ошибка: Нет видео для обработки")
             return
             
-        if not self.use_network:
+        if self.pending_model is not None:
+            # Повторное нажатие во время загрузки отменяет применение
+            self.pending_model = None
+            self.network_button.config(text="Применить")
+            self.info_label.config(text="Применение нейросети отменено")
+        elif not self.use_network:
             # Применить нейросеть
             selected_model = self.model_var.get()
             if selected_model == "Нет моделей":
@@ -172,103 +317,181 @@ class WebcamApp:
                 return
             try:
                 model_path = os.path.join("neural_network_models", selected_model)
-                self.model = YOLO(model_path)
-                self.use_network = True
-                self.network_button.config(text="Прекратить применение")
-                self.info_label.config(text=f"Модель {selected_model} применяется")
+                # Модель из кэша; если она еще загружается, окно не ждет, а
+                # проверяет готовность через after
+                self.pending_model = self.registry.get_async(model_path)
             except Exception as e:
                 self.info_label.config(text=f"Ошибка загрузки модели: {str(e)}")
-                self.model = None
-                self.use_network = False
+                return
+            self.network_button.config(text="Отменить")
+            self.info_label.config(text=f"Загрузка модели {selected_model}...")
+            self.wait_model(selected_model, self.pending_model)
         else:
             # Прекратить применение
             self.use_network = False
+            self.stop_worker()
+            # Лучшие кадры уже найденных объектов сохраняются, без отбрасывания
+            self.commit_candidates(self.selector.flush(), block=True)
             self.model = None
             self.track_history.clear()
             self.saved_track_ids.clear()
             self.network_button.config(text="Применить")
             self.info_label.config(text="Применение нейросети прекращено")
+
+    def wait_model(self, selected_model, future):
+        if future is not self.pending_model:
+            # Загрузка отменена или начата другая
+            return
+        if not future.done():
+            self.window.after(50, self.wait_model, selected_model, future)
+            return
+        self.pending_model = None
+        self.network_button.config(text="Применить")
+        if not self.vid or not self.showing:
+            self.info_label.config(text="Ошибка: Нет видео для обработки")
+            return
+        try:
+            self.model = future.result()
+            reset_trackers(self.model)
+            self.renderer = OverlayRenderer(self.model.names)
+            # Трекинг выполняется в отдельном потоке, окно не блокируется
+            preprocess = RoiPreprocessor(INFERENCE_ROI, INFERENCE_MAX_SIDE, INFERENCE_MASK)
+            self.worker = InferenceWorker(self.model, metrics=self.metrics, preprocess=preprocess)
+            self.last_result_id = None
+            self.use_network = True
+            self.network_button.config(text="Прекратить применение")
+            self.info_label.config(text=f"Модель {selected_model} применяется")
+        except Exception as e:
+            self.info_label.config(text=f"Ошибка загрузки модели: {str(e)}")
+            self.model = None
+            self.use_network = False
+            
+    def stop_worker(self):
+        if self.worker:
+            self.worker.stop()
+            self.worker = None
+        self.last_result_id = None
+        self.last_results = None
+        
+    def process_results(self, results, captured_at=None):
+        # Обновление истории треков и сохранение новых объектов.
+        # Вызывается один раз для каждого нового результата нейросети;
+        # captured_at - время захвата кадра, на котором работала модель.
+        # Давно исчезнувшие треки удаляются вместе с отметками о сохранении
+        self.saved_track_ids.difference_update(self.track_history.evict())
+        if results[0].boxes is not None and results[0].boxes.id is not None:
+            # Снимок сохраняется с того кадра, на котором работала модель
+            frame = results[0].orig_img
+            boxes = results[0].boxes.xywh.cpu()
+            track_ids = results[0].boxes.id.int().cpu().tolist()
+            class_ids = results[0].boxes.cls.int().cpu().tolist()
+            confidences = results[0].boxes.conf.cpu().tolist()
+            
+            for box, track_id, cls, conf in zip(boxes, track_ids, class_ids, confidences):
+                x, y, w, h = box
+                self.track_history.add(track_id, float(x), float(y))
+                    
+                if track_id not in self.saved_track_ids:
+                    # Для трека запоминается только лучший кадр
+                    label = self.model.names[cls]
+                    self.selector.observe(track_id, label, frame, (float(x), float(y), float(w), float(h)), conf,
+                                          now=captured_at)
+        self.commit_candidates(self.selector.poll(captured_at))
+        
+    def commit_candidates(self, candidates, block=False):
+        for candidate in candidates:
+            # Запись файлов выполняется в фоне, здесь только постановка в очередь.
+            # На каждом кадре (block=False) окно не ждет переполненную очередь,
+            # запись отбрасывается; при остановке и закрытии (block=True)
+            # лучшие кадры ждут места в очереди
+            base_filename = self.writer.submit(candidate.frame, candidate.box, candidate.label, candidate.track_id,
+                                               extra={"Confidence": round(candidate.confidence, 3)},
+                                               detected_at=datetime.fromtimestamp(candidate.timestamp), block=block,
+                                               on_saved=partial(self.on_saved, candidate))
+            self.saved_track_ids.add(candidate.track_id)
+            if base_filename is None:
+                self.info_label.config(text=f"Очередь записи переполнена: {self.writer.stats()}")
+
+    def on_saved(self, candidate, base_filename):
+        # Вызывается потоком записи только для записанных файлов, а не для
+        # повторов известного дефекта; надпись обновляется в update
+        if self.clips and self.clips.wants(candidate.label):
+            self.clips.trigger(base_filename, candidate.timestamp)
+        self.saved_names.append(base_filename)
+                
+
+    def draw_overlay(self, frame, results):
+        # Последний результат трекинга накладывается на текущий живой кадр
+        # (рамки, подписи и линии треков за один проход)
+        with self.metrics.timer("draw"):
+            return self.renderer.render(frame, results[0], self.track_history)
             
     def update(self):
         if self.vid and self.vid.isOpened():
-            ret, frame = self.vid.read()
+            frame_id, frame = self.vid.read_latest()
+            # Новый кадр еще не пришел - повторно не обрабатываем
+            ret = frame is not None and frame_id != self.last_frame_id
+            if ret:
+                self.last_frame_id = frame_id
+                if "first_frame" not in startup.marks:
+                    startup.mark("first_frame")
+                    print(startup.summary())
             if ret and self.showing:
-                if self.use_network and self.model:
-                    results = self.model.track(frame, persist=True)
-                    
-                    if results[0].boxes is not None and results[0].boxes.id is not None:
-                        boxes = results[0].boxes.xywh.cpu()
-                        track_ids = results[0].boxes.id.int().cpu().tolist()
-                        class_ids = results[0].boxes.cls.int().cpu().tolist()
-                        
-                        display_frame = results[0].plot()
-                        
-                        for box, track_id, cls in zip(boxes, track_ids, class_ids):
-                            x, y, w, h = box
-                            track = self.track_history[track_id]
-                            track.append((float(x), float(y)))
-                            if len(track) > 30:
-                                track.pop(0)
-                                
-                            points = np.hstack(track).astype(np.int32).reshape((-1, 1, 2))
-                            cv2.polylines(display_frame, [points], isClosed=False, color=(230, 230, 230), thickness=10)
-                            
-                            if track_id not in self.saved_track_ids:
-                                label = self.model.model.names[cls]
-                                annotated_frame = frame.copy()
-                                cv2.rectangle(annotated_frame, (int(x - w / 2), int(y - h / 2)), 
-                                            (int(x + w / 2), int(y + h / 2)), (0, 255, 0), 2)
-                                cv2.putText(annotated_frame, f'{label} ID:{track_id}', 
-                                          (int(x - w / 2), int(y - h / 2) - 10), 
-                                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                                
-                                timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f")
-                                unique_id = uuid.uuid4()
-                                base_filename = f"{timestamp}_{label}_ID_{track_id}_{unique_id}"
-                                image_filename = f"result_images/{base_filename}.jpg"
-                                cv2.imwrite(image_filename, annotated_frame)
-                                
-                                json_filename = f"result_images/{base_filename}.json"
-                                json_data = {
-                                    "DateTimeDetection": timestamp,
-                                    "ClassName": label,
-                                    "Latitude": "N/A",
-                                    "Longitude": "N/A",
-                                    "SectionOfRoad": "Участок дороги",
-                                    "CriticalLevel": 1,
-                                    "RoadClass": "Автомагистраль",
-                                    "RoadCategory": "IВ Общее число полос движения 4 и более",
-                                    "Contractor": "Подрядная организация",
-                                    "ImageName": os.path.basename(image_filename)
-                                }
-                                with open(json_filename, 'w', encoding='utf-8') as json_file:
-                                    json.dump(json_data, json_file, indent=4, ensure_ascii=False)
-                                    
-                                self.saved_track_ids.add(track_id)
-                                self.info_label.config(text=f"Сохранено: {base_filename}.jpg")
-                        
-                        frame = display_frame
-                    else:
-                        frame = results[0].plot()
+                if self.clips:
+                    # Клип и событие отсчитываются от времени захвата, а не обработки
+                    self.clips.add(frame, self.vid.capture_time(frame_id))
+                if self.use_network and self.worker:
+                    self.worker.submit(frame_id, frame)
+                    result_id, results = self.worker.latest()
+                    if results is not None and result_id != self.last_result_id:
+                        self.last_result_id = result_id
+                        self.last_results = results
+                        self.process_results(results, self.vid.capture_time(result_id))
+                    if self.worker.error is not None:
+                        self.info_label.config(text=f"Ошибка нейросети: {self.worker.error}")
+                        self.worker.error = None
+                    if self.last_results is not None:
+                        frame = self.draw_overlay(frame, self.last_results)
                 
-                if self.recording and self.out:
-                    self.out.write(frame)
+                if self.recording and self.recorder:
+                    self.recorder.write(frame)
+                    if self.recorder.error is not None:
+                        # Сообщение об ошибке выводится после итогов записи, чтобы его не затереть
+                        error = self.recorder.error
+                        self.toggle_recording()
+                        self.info_label.config(text=f"Ошибка записи: {error}")
                     
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(frame)
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.canvas.imgtk = imgtk
-                self.canvas.create_image(0, 0, anchor="nw", image=imgtk)
+                if self.saved_names:
+                    self.info_label.config(text=f"Сохранено: {self.saved_names[-1]}.jpg")
+                    self.saved_names.clear()
+
+                with self.metrics.timer("display"):
+                    self.display.show(frame)
+                self.metrics.tick("display")
             elif not self.showing:
-                self.canvas.delete("all")
+                self.display.clear()
                 
         self.window.after(10, self.update)
         
     def on_closing(self):
+        self.pending_model = None
+        self.stop_worker()
+        self.commit_candidates(self.selector.flush(), block=True)
         if self.vid:
             self.vid.release()
-        if self.out:
-            self.out.release()
+        self.stop_recorder()
+        # Дописать все снимки, поставленные в очередь
+        self.writer.close()
+        if self.location:
+            self.location.close()
+        if self.dedup:
+            self.dedup.close()
+        if self.clips:
+            self.clips.close()
+        self.registry.shutdown()
+        self.discovery.stop()
+        self.display.close()
+        startup.save(STARTUP_REPORT)
         self.window.destroy()
 
 if __name__ == "__main__":